@@ -15,9 +15,14 @@
 # ├── services/
 # │   ├── __init__.py
 # │   ├── nlp_service.py
+# │   ├── typo_corrector.py
+# │   ├── batch_sentiment.py
 # │   ├── ml_models.py
 # │   ├── data_store.py
-# │   └── context_manager.py
+# │   ├── context_manager.py
+# │   ├── persistence_queue.py
+# │   ├── workout_library.py
+# │   └── notification_scheduler.py
 # ├── models/
 # │   ├── __init__.py
 # │   ├── user_model.py
@@ -27,6 +32,17 @@
 # │   ├── __init__.py
 # │   ├── helpers.py
 # │   └── validators.py
+# ├── benchmarks/
+# │   ├── __init__.py
+# │   ├── spacy_throughput.py
+# │   ├── intent_quantization.py
+# │   ├── typo_correction.py
+# │   └── batch_sentiment.py
+# ├── tests/
+# │   ├── __init__.py
+# │   ├── test_context_manager.py
+# │   ├── test_notification_scheduler.py
+# │   └── test_personalization_engine.py
 # └── api/
 #     ├── __init__.py
 #     └── endpoints.py
@@ -35,7 +51,7 @@
 """Configuration settings for Coach Core AI Brain"""
 
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Dict, List, Optional
 
 @dataclass
@@ -43,9 +59,27 @@ class AIConfig:
     """AI Brain configuration settings"""
     
     # Model settings
-    nlp_model: str = "bert-base-uncased"
-    embedding_dim: int = 768
+    nlp_model: str = os.getenv("NLP_MODEL", "bert-base-uncased")
+    nlp_quantization: str = os.getenv("NLP_QUANTIZATION", "none")  # none | dynamic_int8
+    spacy_model: str = "en_core_web_sm"
+    spacy_batch_size: int = 256
+    spacy_n_process: int = 1  # worker processes for offline nlp.pipe jobs only
+    nlp_executor_workers: int = 4
+    sentence_embedding_model: str = os.getenv(
+        "SENTENCE_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"
+    )
+    embedding_dim: int = 384
+    answer_index_size: int = 10000
+    answer_similarity_threshold: float = 0.92  # cosine similarity
     max_sequence_length: int = 512
+    length_bucket_width: int = 8  # tokens per padding bucket
+    typo_index_path: str = os.getenv("TYPO_INDEX_PATH", "models/typo_index.json.gz")
+    typo_max_edit_distance: int = 2
+    typo_english_words: int = 30000  # most frequent English words indexed as corrections
+    intent_cascade_threshold: float = 0.75  # escalate below this confidence
+    intent_linear_model_path: str = os.getenv(
+        "INTENT_LINEAR_MODEL_PATH", "models/intent_linear.joblib"
+    )
     
     # Database settings
     db_host: str = os.getenv("DB_HOST", "localhost")
@@ -56,6 +90,53 @@ class AIConfig:
     redis_host: str = os.getenv("REDIS_HOST", "localhost")
     redis_port: int = int(os.getenv("REDIS_PORT", 6379))
     cache_ttl: int = 3600  # 1 hour
+    context_backend: str = os.getenv("CONTEXT_BACKEND", "memory")  # memory | redis
+    context_max_entries: int = 50000
+    context_local_ttl: int = 30  # local tier TTL when a shared backend is used
+    nlp_cache_size: int = 10000
+    nlp_cache_ttl: int = 600  # 10 minutes
+    
+    # Background persistence settings
+    persistence_concurrency: int = 16
+    persistence_max_retries: int = 3
+    persistence_retry_delay: float = 0.2  # seconds, doubled per attempt
+    persistence_flush_timeout: float = 30.0  # seconds allowed on shutdown
+    persistence_max_failed: int = 1000  # recent failures kept for stats
+    persistence_dead_letter_path: str = os.getenv(
+        "PERSISTENCE_DEAD_LETTER_PATH", "data/persistence_dead_letter.jsonl"
+    )
+    
+    # Conversation history settings
+    conversation_window: int = 50  # messages kept hot per conversation
+    summary_max_entities: int = 10  # recent values kept per entity type
+    summary_max_facts: int = 20
+    
+    # Workout library settings
+    workout_library_path: str = os.getenv("WORKOUT_LIBRARY_PATH", "data/workouts.json")
+    workout_library_reload_interval: int = 30  # seconds between file checks
+    
+    # Speculative follow-up settings
+    speculative_ttl: int = 120  # seconds a precomputed follow-up stays valid
+    speculative_max_conversations: int = 10000
+    speculative_max_inflight: int = 32
+    speculative_max_load: float = 0.7  # 1-minute load average per CPU
+    
+    # Personalization profile settings
+    profile_repair_interval: int = 86400  # full recompute at most daily
+    profile_repair_check_interval: int = 3600  # seconds between repair passes
+    
+    # Chat idempotency settings
+    idempotency_cache_size: int = 10000
+    idempotency_ttl: int = 86400  # 24 hours, covers client retry windows
+    
+    # Dialogue prefetch timeouts in seconds, per dependency
+    prefetch_timeouts: Dict[str, float] = field(default_factory=lambda: {
+        "conversation": 2.0,
+        "user": 2.0,
+        "analysis": 5.0,
+        "context": 0.5,
+        "embedding": 5.0
+    })
     
     # API settings
     api_host: str = "0.0.0.0"
@@ -70,6 +151,15 @@ class AIConfig:
     # Engagement settings
     min_engagement_interval: int = 3600  # 1 hour
     max_daily_notifications: int = 5
+    churn_batch_chunk_size: int = 50000  # users scored per worker task
+    churn_batch_workers: int = 4
+    churn_scoring_hour: int = 3  # UTC hour the daily churn job runs
+    notification_queue_path: str = os.getenv(
+        "NOTIFICATION_QUEUE_PATH", "data/notification_queue.jsonl"
+    )
+    notification_batch_size: int = 500
+    notification_max_retries: int = 3
+    notification_retry_delay: int = 60  # seconds, doubled per attempt
     
     # Security settings
     encryption_key: str = os.getenv("ENCRYPTION_KEY", "default-key-change-in-production")
@@ -79,6 +169,7 @@ class AIConfig:
     enable_voice_input: bool = False
     enable_advanced_analytics: bool = True
     enable_social_features: bool = True
+    enable_semantic_answer_reuse: bool = False
 
 config = AIConfig()
 
@@ -106,7 +197,11 @@ from coach_core_ai.services import (
     NLPService,
     MLModels,
     DataStore,
-    ContextManager
+    ContextManager,
+    PersistenceQueue,
+    WorkoutLibrary,
+    NotificationScheduler,
+    LocalPushSender
 )
 from coach_core_ai.api.endpoints import router
 
@@ -144,7 +239,10 @@ class CoachCoreAIBrain:
         self.data_store = DataStore()
         self.nlp_service = NLPService()
         self.ml_models = MLModels()
-        self.context_manager = ContextManager()
+        self.context_manager = ContextManager.from_config()
+        self.persistence_queue = PersistenceQueue()
+        self.workout_library = WorkoutLibrary()
+        self.notification_scheduler = NotificationScheduler(sender=LocalPushSender())
         
         logger.info("Core services initialized successfully")
         
@@ -156,7 +254,9 @@ class CoachCoreAIBrain:
         self.dialogue_engine = DialogueEngine(
             nlp_service=self.nlp_service,
             context_manager=self.context_manager,
-            data_store=self.data_store
+            data_store=self.data_store,
+            persistence_queue=self.persistence_queue,
+            workout_library=self.workout_library
         )
         
         self.progress_analyzer = ProgressAnalyzer(
@@ -175,9 +275,15 @@ class CoachCoreAIBrain:
             data_store=self.data_store
         )
         
+        # Keep personalization profiles current as conversations are saved
+        self.dialogue_engine.interaction_listeners.append(
+            self.personalization_engine.record_interactions
+        )
+        
         self.engagement_manager = EngagementManager(
             ml_models=self.ml_models,
-            data_store=self.data_store
+            data_store=self.data_store,
+            notification_scheduler=self.notification_scheduler
         )
         
         self.learning_module = LearningModule(
@@ -198,6 +304,33 @@ class CoachCoreAIBrain:
     def _setup_routes(self):
         """Setup API routes"""
         self.app.include_router(router, prefix=f"/api/{config.api_version}")
+        self.app.add_event_handler("startup", self._start_services)
+        self.app.add_event_handler("shutdown", self._shutdown_services)
+        
+    async def _start_services(self):
+        """Start background services once the event loop is running"""
+        await self.nlp_service.start()
+        await self.notification_scheduler.start()
+        await self.workout_library.start()
+        await self.personalization_engine.start()
+        await self.engagement_manager.start()
+        
+    async def _shutdown_services(self):
+        """Release service resources on shutdown"""
+        logger.info("Shutting down core services...")
+        
+        # Stop periodic jobs first so they don't start new work
+        await self.engagement_manager.stop()
+        await self.personalization_engine.stop()
+        
+        # Flush pending turn writes before their backends go away
+        await self.persistence_queue.close()
+        await self.notification_scheduler.stop()
+        await self.workout_library.stop()
+        
+        await self.nlp_service.stop()
+        self.nlp_service.close()
+        await self.context_manager.close()
         
     async def start(self):
         """Start the AI Brain server"""
@@ -220,23 +353,251 @@ class CoachCoreAIBrain:
 # === core/dialogue_engine.py ===
 """Dialogue Engine for conversational coaching"""
 
+import asyncio
 import logging
-from typing import Dict, List, Optional, Tuple
+import os
+import re
+import time
+from collections import OrderedDict
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import (
+    Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+)
 from datetime import datetime
 import json
 
+from coach_core_ai.config import config
 from coach_core_ai.models.conversation_model import Conversation, Message
 from coach_core_ai.models.user_model import User
 
 logger = logging.getLogger(__name__)
 
+# Marks prefetched dependencies the turn cannot proceed without
+REQUIRED = object()
+
+class IdempotencyCache:
+    """Bounded TTL cache of chat results keyed by client idempotency key
+    
+    Entries hold the turn's task, so a duplicate that arrives while the
+    original is still running waits for it instead of reprocessing.
+    Failed turns are evicted so the client can retry them.
+    """
+    
+    def __init__(
+        self,
+        max_entries: int = config.idempotency_cache_size,
+        ttl: int = config.idempotency_ttl
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, asyncio.Future]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        
+    async def run(
+        self,
+        key: Tuple[str, str],
+        factory: Callable[[], Awaitable[Dict]]
+    ) -> Dict:
+        """Return the result for ``key``, running ``factory`` only once"""
+        
+        task = self._get(key)
+        if task is not None:
+            self.hits += 1
+            return await asyncio.shield(task)
+            
+        self.misses += 1
+        task = asyncio.ensure_future(factory())
+        self._store(key, task)
+        
+        # A dropped client connection must not cancel a turn duplicates wait on
+        return await asyncio.shield(task)
+        
+    def claim(self, key: Tuple[str, str]) -> Tuple[asyncio.Future, bool]:
+        """Get the result future for ``key``, claiming it if it is new
+        
+        Returns ``(future, True)`` when the caller must produce the result
+        and resolve the future, or ``(future, False)`` to wait on a turn
+        someone else is already running.
+        """
+        
+        future = self._get(key)
+        if future is not None:
+            self.hits += 1
+            return future, False
+            
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._store(key, future)
+        return future, True
+        
+    def _store(self, key: Tuple[str, str], future: asyncio.Future):
+        future.add_done_callback(lambda done: self._evict_failed(key, done))
+        self._entries[key] = (time.monotonic() + self.ttl, future)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            
+    def _get(self, key: Tuple[str, str]) -> Optional[asyncio.Future]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, task = entry
+        # Failures may not have been evicted by their callback yet
+        failed = task.done() and (task.cancelled() or task.exception() is not None)
+        if failed or expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        return task
+        
+    def _evict_failed(self, key: Tuple[str, str], task: asyncio.Future):
+        if task.cancelled() or task.exception() is not None:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is task:
+                del self._entries[key]
+
+class SpeculativeResponses:
+    """Short-lived per-conversation store of precomputed follow-up replies
+    
+    Holds at most one set of follow-ups per conversation (the suggestions
+    of its latest reply), evicting least recently used conversations
+    beyond ``max_conversations``. Precomputation is skipped while the
+    host is under CPU pressure or too many runs are already in flight.
+    """
+    
+    def __init__(
+        self,
+        ttl: int = config.speculative_ttl,
+        max_conversations: int = config.speculative_max_conversations,
+        max_inflight: int = config.speculative_max_inflight,
+        max_load: float = config.speculative_max_load
+    ):
+        self.ttl = ttl
+        self.max_conversations = max_conversations
+        self.max_inflight = max_inflight
+        self.max_load = max_load
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Dict]]]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._load_checked_at = 0.0
+        self._under_pressure = False
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        
+    @staticmethod
+    def normalize(message: str) -> str:
+        return " ".join(message.lower().split())
+        
+    def under_pressure(self) -> bool:
+        """Whether CPU load is too high for speculative work (checked once a second)"""
+        
+        now = time.monotonic()
+        if now - self._load_checked_at >= 1.0:
+            self._load_checked_at = now
+            try:
+                load = os.getloadavg()[0] / (os.cpu_count() or 1)
+            except OSError:
+                load = 0.0
+            self._under_pressure = load > self.max_load
+        return self._under_pressure
+        
+    def schedule(
+        self,
+        conversation_id: str,
+        suggestions: List[str],
+        compute: Callable[[str], Awaitable[Dict]]
+    ):
+        """Replace a conversation's follow-ups with a fresh background run"""
+        
+        self.discard(conversation_id)
+        
+        if len(self._tasks) >= self.max_inflight or self.under_pressure():
+            self.skipped += 1
+            return
+            
+        task = asyncio.ensure_future(
+            self._precompute(conversation_id, suggestions, compute)
+        )
+        self._tasks[conversation_id] = task
+        task.add_done_callback(lambda done: self._finished(conversation_id, done))
+        
+    def take(self, conversation_id: str, message: str) -> Optional[Dict]:
+        """Pop the precomputed reply for a tapped suggestion, if still fresh
+        
+        Any new message makes the conversation's other follow-ups stale,
+        so they are dropped either way.
+        """
+        
+        entry = self._entries.get(conversation_id)
+        self.discard(conversation_id)
+        if entry is not None:
+            expires_at, responses = entry
+            result = responses.get(self.normalize(message))
+            if result is not None and expires_at > time.monotonic():
+                self.hits += 1
+                return result
+        self.misses += 1
+        return None
+        
+    def discard(self, conversation_id: str):
+        """Drop stored and in-flight follow-ups for a conversation"""
+        
+        self._entries.pop(conversation_id, None)
+        task = self._tasks.pop(conversation_id, None)
+        if task is not None:
+            task.cancel()
+            
+    def stats(self) -> Dict:
+        return {
+            "conversations": len(self._entries),
+            "inflight": len(self._tasks),
+            "hits": self.hits,
+            "misses": self.misses,
+            "skipped": self.skipped
+        }
+        
+    async def _precompute(
+        self,
+        conversation_id: str,
+        suggestions: List[str],
+        compute: Callable[[str], Awaitable[Dict]]
+    ):
+        responses = {}
+        for suggestion in suggestions:
+            # Back off as soon as real traffic needs the CPU
+            if self.under_pressure():
+                self.skipped += 1
+                break
+            try:
+                responses[self.normalize(suggestion)] = await compute(suggestion)
+            except Exception as e:
+                logger.debug(f"Speculative follow-up '{suggestion}' failed: {e}")
+                
+        if responses:
+            self._entries[conversation_id] = (time.monotonic() + self.ttl, responses)
+            self._entries.move_to_end(conversation_id)
+            while len(self._entries) > self.max_conversations:
+                self._entries.popitem(last=False)
+                
+    def _finished(self, conversation_id: str, task: asyncio.Task):
+        if self._tasks.get(conversation_id) is task:
+            del self._tasks[conversation_id]
+
 class DialogueEngine:
     """Manages conversational interactions with users"""
     
-    def __init__(self, nlp_service, context_manager, data_store):
+    def __init__(
+        self,
+        nlp_service,
+        context_manager,
+        data_store,
+        persistence_queue,
+        workout_library
+    ):
         self.nlp_service = nlp_service
         self.context_manager = context_manager
         self.data_store = data_store
+        self.persistence_queue = persistence_queue
+        self.workout_library = workout_library
         
         # Coaching domain handlers
         self.domain_handlers = {
@@ -247,89 +608,671 @@ class DialogueEngine:
             "general": self._handle_general_query
         }
         
+        # Domains whose turns may be answered from promoted FAQ answers
+        self.reusable_domains = {"general"}
+        
+        # Domains whose suggested follow-ups are worth precomputing
+        self.speculative_domains = {"fitness"}
+        self.speculative_responses = SpeculativeResponses()
+        
+        # Called with (user_id, messages) once a turn is saved
+        self.interaction_listeners: List[Callable[[str, List], Awaitable]] = []
+        
+        # Turns of one conversation run one at a time
+        self._conversation_locks: Dict[str, List] = {}  # id -> [lock, users]
+        self.idempotency_cache = IdempotencyCache()
+        
+        # Streamed turns run detached from their client
+        self._stream_tasks: set = set()
+        
     async def process_message(
+        self,
+        user_id: str,
+        message: str,
+        conversation_id: Optional[str] = None,
+        idempotency_key: Optional[str] = None
+    ) -> Dict:
+        """Process incoming user message and generate response
+        
+        Requests repeating an ``idempotency_key`` get the original result
+        instead of being processed again.
+        """
+        
+        if idempotency_key:
+            return await self.idempotency_cache.run(
+                (user_id, idempotency_key),
+                lambda: self._process_message(user_id, message, conversation_id)
+            )
+            
+        return await self._process_message(user_id, message, conversation_id)
+        
+    async def _process_message(
+        self,
+        user_id: str,
+        message: str,
+        conversation_id: Optional[str]
+    ) -> Dict:
+        """Run a full dialogue turn under the conversation's lock"""
+        
+        async with self._conversation_lock(conversation_id):
+            turn = await self._prepare_turn(user_id, message, conversation_id)
+            response = await self._generate_turn_response(turn)
+            await self._complete_turn(turn, response)
+            
+        return self._build_result(turn, response)
+        
+    @asynccontextmanager
+    async def _conversation_lock(self, conversation_id: Optional[str]):
+        """Serialize turns of one conversation; new conversations need no lock"""
+        
+        if not conversation_id:
+            yield
+            return
+            
+        entry = self._conversation_locks.get(conversation_id)
+        if entry is None:
+            entry = self._conversation_locks[conversation_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            # Drop the lock once nobody holds or waits on it
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._conversation_locks[conversation_id]
+        
+    async def process_message_stream(
         self,
         user_id: str,
         message: str,
         conversation_id: Optional[str] = None
+    ) -> AsyncIterator[Dict]:
+        """Process message, yielding response events
+        
+        Emits a ``metadata`` event (conversation, intent, domain) as soon as
+        the message is analyzed. Once the response is generated and the turn
+        persisted, it sends the response as ``text`` chunks, then
+        ``suggestions`` and ``actions``, and finally ``done`` with the full
+        result. The turn runs in its own task, so a client that disconnects
+        or reads slowly neither loses the turn nor holds the conversation
+        lock.
+        """
+        
+        metadata = asyncio.get_running_loop().create_future()
+        task = asyncio.create_task(
+            self._run_streamed_turn(user_id, message, conversation_id, metadata)
+        )
+        self._stream_tasks.add(task)
+        task.add_done_callback(self._stream_tasks.discard)
+        
+        yield {"event": "metadata", "data": await asyncio.shield(metadata)}
+        
+        turn, response = await asyncio.shield(task)
+        for chunk in self._chunk_text(response["text"]):
+            yield {"event": "text", "data": {"text": chunk}}
+            
+        yield {"event": "suggestions", "data": response.get("suggestions", [])}
+        yield {"event": "actions", "data": response.get("actions", [])}
+        yield {"event": "done", "data": self._build_result(turn, response)}
+        
+    async def _run_streamed_turn(
+        self,
+        user_id: str,
+        message: str,
+        conversation_id: Optional[str],
+        metadata: asyncio.Future
+    ) -> Optional[Tuple[Dict, Dict]]:
+        """Run a full turn, publishing its metadata once analyzed"""
+        
+        async with self._conversation_lock(conversation_id):
+            try:
+                turn = await self._prepare_turn(user_id, message, conversation_id)
+            except Exception as e:
+                # The stream reports it through the metadata future
+                metadata.set_exception(e)
+                return None
+                
+            metadata.set_result({
+                "conversation_id": turn["conversation"].id,
+                **self._turn_metadata(turn)
+            })
+            
+            response = await self._generate_turn_response(turn)
+            await self._complete_turn(turn, response)
+            
+        return turn, response
+        
+    async def _prepare_turn(
+        self,
+        user_id: str,
+        message: str,
+        conversation_id: Optional[str]
     ) -> Dict:
-        """Process incoming user message and generate response"""
+        """Load conversation state, analyze message and pick a domain"""
         
-        # Get or create conversation
+        # Conversation, user, analysis and context are independent,
+        # so fetch them concurrently
+        timings: Dict[str, float] = {}
+        
+        # Read-your-writes: let the previous turn's writes land first
+        if conversation_id:
+            await self._prefetch(
+                "pending_writes",
+                self.persistence_queue.wait_for(conversation_id),
+                timings,
+                default=None
+            )
+            
         if conversation_id:
-            conversation = await self.data_store.get_conversation(conversation_id)
+            conversation_fetch = self.data_store.get_conversation(conversation_id)
+            # New conversations have no context yet
+            context_fetch = self.context_manager.get_context(user_id, conversation_id)
         else:
-            conversation = await self._create_conversation(user_id)
+            conversation_fetch = self._create_conversation(user_id)
+            context_fetch = self._empty_context()
             
-        # Get user profile
-        user = await self.data_store.get_user(user_id)
+        conversation, user, analysis, context = await asyncio.gather(
+            self._prefetch("conversation", conversation_fetch, timings),
+            self._prefetch("user", self.data_store.get_user(user_id), timings),
+            self._prefetch("analysis", self.nlp_service.analyze_message(message), timings),
+            self._prefetch("context", context_fetch, timings, default={})
+        )
+        
+        turn = self._resolve_turn(
+            user_id, message, conversation, user, analysis, context, timings
+        )
+        await self._reuse_answers([turn], timings)
+        logger.debug(f"Dialogue prefetch timings: {timings}")
+        
+        return turn
+        
+    def _resolve_turn(
+        self,
+        user_id: str,
+        message: str,
+        conversation: Conversation,
+        user: Optional[User],
+        analysis: Dict,
+        context: Dict,
+        timings: Dict[str, float]
+    ) -> Dict:
+        """Pick a domain for loaded turn inputs"""
+        
+        domain = self._determine_domain(
+            analysis["intent"],
+            analysis["entities"],
+            context,
+            analysis.get("domains")
+        )
+        
+        return {
+            "user_id": user_id,
+            "message": message,
+            "conversation": conversation,
+            "user": user,
+            "analysis": analysis,
+            "context": context,
+            "reused": None,
+            "domain": domain,
+            "timings": timings
+        }
+        
+    async def _reuse_answers(
+        self,
+        turns: List[Optional[Dict]],
+        timings: Dict[str, float]
+    ):
+        """Answer eligible turns from semantically close promoted answers
+        
+        Only turns the cheap tiers left in a reusable domain are embedded,
+        and a pattern-matched intent is never overridden, so most traffic
+        never reaches the sentence encoder.
+        """
         
-        # Analyze message
-        analysis = await self.nlp_service.analyze_message(message)
-        intent = analysis["intent"]
-        entities = analysis["entities"]
-        sentiment = analysis["sentiment"]
+        if not config.enable_semantic_answer_reuse:
+            return
+            
+        eligible = [
+            turn for turn in turns
+            if turn is not None
+            and turn["domain"] in self.reusable_domains
+            and turn["analysis"].get("intent_tier") != "pattern"
+        ]
+        if not eligible:
+            return
+            
+        embeddings = await self._prefetch(
+            "embedding",
+            self.nlp_service.embed_messages([turn["message"] for turn in eligible]),
+            timings,
+            default=None
+        )
+        if embeddings is None:
+            return
+            
+        for turn, embedding in zip(eligible, embeddings):
+            reused = await self.nlp_service.find_similar_answer(embedding)
+            if reused:
+                turn["reused"] = reused
+                turn["domain"] = reused["domain"]
+                
+    async def _prefetch(
+        self,
+        name: str,
+        awaitable: Awaitable,
+        timings: Dict[str, float],
+        default: Any = REQUIRED
+    ) -> Any:
+        """Await a turn dependency with its own timeout, recording time in ms
         
-        # Get conversation context
-        context = await self.context_manager.get_context(user_id, conversation_id)
+        Optional dependencies fall back to ``default`` on timeout; required
+        ones re-raise.
+        """
         
+        start = time.perf_counter()
+        try:
+            return await asyncio.wait_for(
+                awaitable, config.prefetch_timeouts.get(name)
+            )
+        except asyncio.TimeoutError:
+            if default is REQUIRED:
+                raise
+            logger.warning(f"Prefetch of {name} timed out, continuing without it")
+            return default
+        finally:
+            timings[name] = (time.perf_counter() - start) * 1000
+            
+    async def _empty_context(self) -> Dict:
+        return {}
+        
+    async def _generate_turn_response(self, turn: Dict) -> Dict:
+        """Generate response for a prepared turn"""
+        
+        if turn["reused"]:
+            return turn["reused"]["response"]
+            
+        # Answer a tapped suggestion from its precomputed reply
+        conversation = turn["conversation"]
+        if conversation is not None:
+            precomputed = self.speculative_responses.take(
+                conversation.id, turn["message"]
+            )
+            if precomputed is not None and precomputed["domain"] == turn["domain"]:
+                turn["precomputed"] = True
+                return precomputed["response"]
+                
         # Generate response based on intent and domain
-        domain = self._determine_domain(intent, entities, context)
-        response = await self.domain_handlers[domain](
-            user, message, intent, entities, sentiment, context
+        analysis = turn["analysis"]
+        return await self.domain_handlers[turn["domain"]](
+            turn["user"],
+            turn["message"],
+            analysis["intent"],
+            analysis["entities"],
+            analysis["sentiment"],
+            turn["context"]
+        )
+        
+    async def _complete_turn(self, turn: Dict, response: Dict):
+        """Queue conversation history and context writes for a finished turn"""
+        
+        conversation = turn["conversation"]
+        
+        # Append in-process so retries of the write don't duplicate messages
+        turn["messages"] = self._append_turn_messages(
+            conversation, turn["message"], response, turn["analysis"]
+        )
+        
+        self.persistence_queue.submit(
+            conversation.id,
+            lambda: self._persist_turn(turn),
+            describe=lambda: self._turn_record(turn)
         )
         
-        # Update conversation history
-        await self._update_conversation(
-            conversation, user_id, message, response, analysis
+        # Users often tap a suggestion next, so prepare those replies now
+        if turn["domain"] in self.speculative_domains and response.get("suggestions"):
+            self.speculative_responses.schedule(
+                conversation.id,
+                response["suggestions"],
+                lambda suggestion: self._precompute_follow_up(turn, suggestion)
+            )
+            
+    async def _precompute_follow_up(self, turn: Dict, suggestion: str) -> Dict:
+        """Compute the reply a suggestion would get as the next turn"""
+        
+        analysis = await self.nlp_service.analyze_message(suggestion)
+        
+        # Context as it will be once this turn's writes land
+        context = {**turn["context"], **self._turn_context_updates(turn)}
+        domain = self._determine_domain(
+            analysis["intent"],
+            analysis["entities"],
+            context,
+            analysis.get("domains")
+        )
+        response = await self.domain_handlers[domain](
+            turn["user"],
+            suggestion,
+            analysis["intent"],
+            analysis["entities"],
+            analysis["sentiment"],
+            context
         )
+        return {"domain": domain, "response": response}
+        
+    def _turn_record(self, turn: Dict) -> Dict:
+        """Data needed to replay a turn's writes"""
+        
+        return {
+            "user_id": turn["user_id"],
+            "conversation_id": turn["conversation"].id,
+            "messages": [m.to_dict() for m in turn["messages"]],
+            "context": self._turn_context_updates(turn)
+        }
+        
+    async def _persist_turn(self, turn: Dict):
+        """Save conversation history and context for a turn"""
+        
+        # Save updated conversation
+        await self.data_store.save_conversation(turn["conversation"])
         
         # Update context
+        await self._update_turn_context(turn)
+        
+        await self._notify_interaction_listeners(turn)
+        
+    async def _notify_interaction_listeners(self, turn: Dict):
+        """Hand a saved turn's messages to interaction listeners"""
+        
+        for listener in self.interaction_listeners:
+            # Listener failures must not make the queue retry the save
+            try:
+                await listener(turn["user_id"], turn["messages"])
+            except Exception as e:
+                logger.error(f"Interaction listener failed for {turn['user_id']}: {e}")
+        
+    async def _update_turn_context(self, turn: Dict):
+        """Record a turn's intent, domain and entities in conversation context"""
+        
         await self.context_manager.update_context(
-            user_id, conversation_id, {
-                "last_intent": intent,
-                "last_domain": domain,
-                "last_entities": entities
-            }
+            turn["user_id"], turn["conversation"].id,
+            self._turn_context_updates(turn)
         )
         
+    @staticmethod
+    def _turn_context_updates(turn: Dict) -> Dict:
+        """Context fields a finished turn writes"""
+        
+        analysis = turn["analysis"]
+        return {
+            "last_intent": analysis["intent"],
+            "last_domain": turn["domain"],
+            "last_entities": analysis["entities"]
+        }
+        
+    async def process_messages_batch(self, requests: List[Dict]) -> List[Dict]:
+        """Process many independent chat messages in one pass
+        
+        Requests carrying an ``idempotency_key`` are deduplicated per item
+        like ``process_message``: a repeated key gets the original result
+        instead of being processed again, within and across batches.
+        """
+        
+        claims: Dict[int, asyncio.Future] = {}
+        owned = []
+        for index, request in enumerate(requests):
+            if request.get("idempotency_key"):
+                future, created = self.idempotency_cache.claim(
+                    (request["user_id"], request["idempotency_key"])
+                )
+                claims[index] = future
+                if not created:
+                    continue
+            owned.append(index)
+            
+        try:
+            owned_results = await self._process_messages_batch(
+                [requests[index] for index in owned]
+            )
+        except BaseException as e:
+            # Don't leave duplicates waiting on a batch that never finished
+            for index in owned:
+                if index in claims and not claims[index].done():
+                    claims[index].set_exception(RuntimeError(f"Batch failed: {e!r}"))
+            raise
+            
+        results: List[Optional[Dict]] = [None] * len(requests)
+        for index, result in zip(owned, owned_results):
+            results[index] = result
+            if index in claims:
+                # Failed items are evicted so the client can retry them
+                if "error" in result:
+                    claims[index].set_exception(RuntimeError(result["error"]))
+                else:
+                    claims[index].set_result(result)
+                    
+        for index, future in claims.items():
+            if results[index] is None:
+                try:
+                    results[index] = await asyncio.shield(future)
+                except Exception as e:
+                    results[index] = {
+                        "conversation_id": requests[index].get("conversation_id"),
+                        "error": str(e)
+                    }
+                    
+        return results
+        
+    async def _process_messages_batch(self, requests: List[Dict]) -> List[Dict]:
+        """Run a batch of chat messages through shared NLP, fetches and saves
+        
+        Each request has ``user_id``, ``message`` and an optional
+        ``conversation_id``. NLP analysis and answer-reuse embedding run
+        as single batches, users and conversations are fetched in bulk, domain
+        handlers run concurrently, and all conversations are saved in one
+        transaction. Results come back in request order; a request whose
+        handler fails gets an ``error`` entry instead of failing the batch.
+        Messages of the same conversation within one batch all see the
+        context from before the batch.
+        """
+        
+        if not requests:
+            return []
+            
+        timings: Dict[str, float] = {}
+        conversation_ids = sorted({
+            r["conversation_id"] for r in requests if r.get("conversation_id")
+        })
+        
+        async with AsyncExitStack() as stack:
+            # Lock in a fixed order so overlapping batches can't deadlock
+            for conversation_id in conversation_ids:
+                await stack.enter_async_context(
+                    self._conversation_lock(conversation_id)
+                )
+                await self.persistence_queue.wait_for(conversation_id)
+                
+            messages = [r["message"] for r in requests]
+            users, conversations, analyses, contexts = await asyncio.gather(
+                self._prefetch(
+                    "user",
+                    self.data_store.get_users({r["user_id"] for r in requests}),
+                    timings
+                ),
+                self._prefetch(
+                    "conversation",
+                    self.data_store.get_conversations(conversation_ids),
+                    timings
+                ),
+                self._prefetch(
+                    "analysis",
+                    self.nlp_service.analyze_messages_batch(messages),
+                    timings
+                ),
+                self._prefetch(
+                    "context",
+                    asyncio.gather(*[
+                        self.context_manager.get_context(
+                            r["user_id"], r.get("conversation_id")
+                        )
+                        for r in requests
+                    ]),
+                    timings,
+                    default=[{} for _ in requests]
+                )
+            )
+            
+            turns: List[Optional[Dict]] = []
+            for index, request in enumerate(requests):
+                conversation_id = request.get("conversation_id")
+                if conversation_id:
+                    conversation = conversations.get(conversation_id)
+                    if conversation is None:
+                        turns.append(None)
+                        continue
+                else:
+                    # Saved with the rest of the batch below
+                    conversation = Conversation(
+                        user_id=request["user_id"],
+                        started_at=datetime.utcnow()
+                    )
+                turns.append(self._resolve_turn(
+                    request["user_id"],
+                    request["message"],
+                    conversation,
+                    users.get(request["user_id"]),
+                    analyses[index],
+                    contexts[index],
+                    timings
+                ))
+            await self._reuse_answers(turns, timings)
+                
+            start = time.perf_counter()
+            responses = await asyncio.gather(
+                *[
+                    self._generate_turn_response(turn)
+                    for turn in turns if turn is not None
+                ],
+                return_exceptions=True
+            )
+            timings["responses"] = (time.perf_counter() - start) * 1000
+            
+            results = []
+            completed = []
+            responses = iter(responses)
+            for request, turn in zip(requests, turns):
+                if turn is None:
+                    results.append({
+                        "conversation_id": request["conversation_id"],
+                        "error": "Conversation not found"
+                    })
+                    continue
+                response = next(responses)
+                if isinstance(response, Exception):
+                    logger.error(f"Batch turn for {request['user_id']} failed: {response}")
+                    results.append({
+                        "conversation_id": turn["conversation"].id,
+                        "error": str(response)
+                    })
+                    continue
+                turn["messages"] = self._append_turn_messages(
+                    turn["conversation"], turn["message"], response, turn["analysis"]
+                )
+                completed.append(turn)
+                results.append(self._build_result(turn, response))
+                
+            # One save for every touched conversation, then context in order
+            touched = {turn["conversation"].id: turn["conversation"] for turn in completed}
+            await self.data_store.save_conversations(list(touched.values()))
+            for turn in completed:
+                await self._update_turn_context(turn)
+                await self._notify_interaction_listeners(turn)
+                
+        logger.debug(f"Batch of {len(requests)} dialogue turns timings: {timings}")
+        return results
+        
+    async def get_conversation_history(
+        self,
+        conversation_id: str,
+        limit: Optional[int] = None
+    ) -> Dict:
+        """Get a conversation's summary and message history"""
+        
+        # Include writes from a turn that just finished
+        await self.persistence_queue.wait_for(conversation_id)
+        
+        return {
+            "conversation_id": conversation_id,
+            "summary": await self.data_store.get_conversation_summary(conversation_id),
+            "messages": await self.data_store.get_conversation_history(
+                conversation_id, limit
+            )
+        }
+        
+    def _turn_metadata(self, turn: Dict) -> Dict:
+        """Build response metadata for a turn"""
+        
+        analysis = turn["analysis"]
+        reused = turn["reused"]
+        return {
+            "intent": analysis["intent"],
+            "domain": turn["domain"],
+            "sentiment": analysis["sentiment"],
+            "confidence": analysis["confidence"],
+            "reused_answer": reused is not None,
+            "answer_similarity": reused["similarity"] if reused else None,
+            "prefetch_timings": turn["timings"],
+            "precomputed": turn.get("precomputed", False)
+        }
+        
+    def _build_result(self, turn: Dict, response: Dict) -> Dict:
+        """Build API result for a completed turn"""
+        
         return {
-            "conversation_id": conversation.id,
+            "conversation_id": turn["conversation"].id,
             "response": response["text"],
             "suggestions": response.get("suggestions", []),
             "actions": response.get("actions", []),
-            "metadata": {
-                "intent": intent,
-                "domain": domain,
-                "sentiment": sentiment,
-                "confidence": analysis["confidence"]
-            }
+            "metadata": self._turn_metadata(turn)
         }
         
+    @staticmethod
+    def _chunk_text(text: str) -> List[str]:
+        """Split response text into sentence/line chunks for streaming"""
+        return [chunk for chunk in re.split(r"(?<=[.!?]\s)|(?<=\n)", text) if chunk]
+        
+    async def promote_answer(
+        self,
+        question: str,
+        response: Dict,
+        domain: str
+    ):
+        """Add a curated or highly rated answer to the semantic answer index"""
+        
+        if not config.enable_semantic_answer_reuse:
+            logger.warning("Semantic answer reuse is disabled, not promoting answer")
+            return
+            
+        embedding = (await self.nlp_service.embed_messages([question]))[0]
+        self.nlp_service.remember_answer(embedding, question, response, domain)
+        
     def _determine_domain(
         self,
         intent: str,
         entities: List[Dict],
-        context: Dict
+        context: Dict,
+        domain_hits: Optional[Dict[str, int]] = None
     ) -> str:
         """Determine the coaching domain for the query"""
         
-        # Domain keywords mapping
-        domain_keywords = {
-            "fitness": ["workout", "exercise", "training", "gym", "cardio", "strength"],
-            "nutrition": ["diet", "food", "meal", "calories", "nutrition", "eating"],
-            "mental_wellness": ["stress", "anxiety", "mood", "meditation", "mindfulness", "mental"],
-            "productivity": ["goals", "tasks", "schedule", "focus", "time", "productivity"]
-        }
-        
-        # Check entities for domain indicators
-        for entity in entities:
-            for domain, keywords in domain_keywords.items():
-                if any(keyword in entity.get("value", "").lower() for keyword in keywords):
-                    return domain
-                    
+        # Exercise entities always indicate fitness
+        if any(e.get("type") == "exercise_type" for e in entities):
+            return "fitness"
+            
         # Check intent mapping
         intent_domain_map = {
+            "workout_recommendation": "fitness",
+            "meal_planning": "nutrition",
             "fitness_query": "fitness",
             "nutrition_query": "nutrition",
             "mental_health_query": "mental_wellness",
@@ -339,6 +1282,10 @@ class DialogueEngine:
         if intent in intent_domain_map:
             return intent_domain_map[intent]
             
+        # Domain with the most keyword hits, earliest mention on ties
+        if domain_hits:
+            return max(domain_hits, key=domain_hits.get)
+            
         # Use context if available
         if context.get("last_domain"):
             return context["last_domain"]
@@ -545,15 +1492,14 @@ class DialogueEngine:
         await self.data_store.save_conversation(conversation)
         return conversation
         
-    async def _update_conversation(
+    def _append_turn_messages(
         self,
         conversation: Conversation,
-        user_id: str,
         user_message: str,
         response: Dict,
         analysis: Dict
-    ):
-        """Update conversation history"""
+    ) -> List[Message]:
+        """Append a turn's user and AI messages to conversation history"""
         
         # Add user message
         user_msg = Message(
@@ -576,8 +1522,7 @@ class DialogueEngine:
         )
         conversation.messages.append(ai_msg)
         
-        # Save updated conversation
-        await self.data_store.save_conversation(conversation)
+        return [user_msg, ai_msg]
         
     # Additional helper methods for generating responses...
     async def _get_specific_workout(
@@ -587,7 +1532,12 @@ class DialogueEngine:
         preferences: Dict
     ) -> Dict:
         """Get specific workout plan"""
-        # Implementation would fetch from workout database
+        
+        workouts = self.workout_library.find(exercise_type, fitness_level, preferences)
+        if workouts:
+            return workouts[0]
+            
+        # Nothing in the catalog for this type and level
         return {
             "type": exercise_type,
             "level": fitness_level,
@@ -595,6 +1545,25 @@ class DialogueEngine:
             "exercises": [],
             "duration": 45
         }
+        
+    async def _get_balanced_workout(
+        self,
+        fitness_level: str,
+        preferences: Dict
+    ) -> Dict:
+        """Get best workout across exercise types"""
+        
+        workouts = self.workout_library.find(None, fitness_level, preferences)
+        if workouts:
+            return workouts[0]
+            
+        return {
+            "type": "balanced",
+            "level": fitness_level,
+            "description": f"Balanced full-body workout for {fitness_level} level",
+            "exercises": [],
+            "duration": 45
+        }
 
 # === core/progress_analyzer.py ===
 """Progress Analyzer for tracking and analyzing user progress"""
@@ -1329,19 +2298,294 @@ class MotivationalEngine:
 # === core/personalization_engine.py ===
 """Personalization Engine for adapting AI interactions to individual users"""
 
+import asyncio
 import logging
-from typing import Dict, List, Optional, Any
-from datetime import datetime
+import re
+import time
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Optional, Any, Tuple
+from datetime import datetime, timedelta
 import numpy as np
 
+from coach_core_ai.config import config
+from coach_core_ai.services.data_store import as_datetime, message_to_dict
+
 logger = logging.getLogger(__name__)
 
-class PersonalizationEngine:
+# Bump when the stored profile state layout changes; older states are rebuilt
+PROFILE_SCHEMA_VERSION = 2
+
+SOCIAL_KEYWORDS = ["team", "together", "group", "friends", "community"]
+PLANNING_KEYWORDS = ["plan", "schedule", "goal", "track", "progress"]
+
+# Upper edges (seconds) of the response-time histogram; the last bucket is open
+RESPONSE_TIME_BUCKETS = [10, 30, 60, 300, 900, 3600]
+
+# Dimensions of the user vector features are scored against
+PROFILE_DIMENSIONS = [
+    "extraversion",
+    "conscientiousness",
+    "detail_high",
+    "detail_low",
+    "engagement_high",
+    "visual_learner",
+    "morning_user",
+    "evening_user",
+    "baseline"
+]
+
+# Feature affinity for each profile dimension; unlisted dimensions are 0
+FEATURE_AFFINITIES = {
+    "team_challenges": {"extraversion": 1.0, "engagement_high": 0.3, "baseline": 0.1},
+    "community_feed": {"extraversion": 0.8, "baseline": 0.15},
+    "goal_tracker": {"conscientiousness": 1.0, "detail_high": 0.2, "baseline": 0.2},
+    "progress_charts": {"conscientiousness": 0.6, "visual_learner": 0.5, "detail_high": 0.3, "baseline": 0.1},
+    "detailed_reports": {"detail_high": 0.9, "conscientiousness": 0.3},
+    "quick_tips": {"detail_low": 0.9, "baseline": 0.1},
+    "workout_videos": {"visual_learner": 1.0, "baseline": 0.2},
+    "morning_reminders": {"morning_user": 0.8, "engagement_high": 0.2},
+    "evening_reflection": {"evening_user": 0.8, "conscientiousness": 0.2},
+    "streak_rewards": {"engagement_high": 0.8, "baseline": 0.1}
+}
+
+# Unknown features get only a small baseline score
+DEFAULT_FEATURE_AFFINITY = {"baseline": 0.05}
+
+RECOMMENDATION_REASONS = {
+    "extraversion": "You enjoy connecting with others",
+    "conscientiousness": "You like to plan and track your goals",
+    "detail_high": "You like in-depth information",
+    "detail_low": "You prefer quick, to-the-point guidance",
+    "engagement_high": "You check in often",
+    "visual_learner": "You learn best visually",
+    "morning_user": "You're most active in the morning",
+    "evening_user": "You're most active in the evening",
+    "baseline": "Popular with other members"
+}
+
+def new_profile_state() -> Dict:
+    """Empty profile state, before any interactions"""
+    return {
+        "schema": PROFILE_SCHEMA_VERSION,
+        "version": 0,
+        "rebuilt_at": None,
+        "interaction_count": 0,
+        "type_counts": {},
+        "user_message_count": 0,
+        "length_mean": 0.0,
+        "length_m2": 0.0,  # sum of squared deviations, for variance
+        "response_time_count": 0,
+        "response_time_mean": 0.0,
+        "response_time_histogram": [0] * (len(RESPONSE_TIME_BUCKETS) + 1),
+        "social_mentions": 0,
+        "planning_mentions": 0,
+        "hour_counts": [0] * 24,
+        "last_sender": None,
+        "last_timestamp": None
+    }
+
+def fold_interaction(state: Dict, interaction: Dict) -> Dict:
+    """Update profile state in place with one interaction
+    
+    Interactions are ``{"type", "timestamp", "data"}`` records as returned
+    by ``DataStore.get_user_interactions``, with message content and
+    sender under ``data``. Means are maintained as running means, so the
+    state is the same whether built incrementally or in one pass.
+    """
+    
+    state["interaction_count"] += 1
+    interaction_type = interaction.get("type", "message")
+    state["type_counts"][interaction_type] = state["type_counts"].get(interaction_type, 0) + 1
+    
+    data = interaction.get("data") or {}
+    sender = data.get("sender")
+    timestamp = as_datetime(interaction.get("timestamp"))
+    
+    if sender == "user":
+        content = data.get("content", "")
+        lowered = content.lower()
+        state["user_message_count"] += 1
+        delta = len(content) - state["length_mean"]
+        state["length_mean"] += delta / state["user_message_count"]
+        state["length_m2"] += delta * (len(content) - state["length_mean"])
+        if any(keyword in lowered for keyword in SOCIAL_KEYWORDS):
+            state["social_mentions"] += 1
+        if any(keyword in lowered for keyword in PLANNING_KEYWORDS):
+            state["planning_mentions"] += 1
+        if timestamp is not None:
+            state["hour_counts"][timestamp.hour] += 1
+            
+        # Response time: user reply following an AI message
+        last_timestamp = as_datetime(state["last_timestamp"])
+        if state["last_sender"] == "ai" and timestamp and last_timestamp:
+            response_time = (timestamp - last_timestamp).total_seconds()
+            state["response_time_count"] += 1
+            state["response_time_mean"] += (
+                (response_time - state["response_time_mean"])
+                / state["response_time_count"]
+            )
+            bucket = int(np.searchsorted(RESPONSE_TIME_BUCKETS, response_time))
+            state["response_time_histogram"][bucket] += 1
+            
+    if sender is not None:
+        state["last_sender"] = sender
+    if timestamp is not None:
+        state["last_timestamp"] = timestamp.isoformat()
+        
+    return state
+
+@lru_cache(maxsize=64)
+def feature_matrix(features: Tuple[str, ...]) -> np.ndarray:
+    """Stack feature affinity vectors into a read-only (features x dimensions) matrix"""
+    
+    matrix = np.zeros((len(features), len(PROFILE_DIMENSIONS)), dtype=np.float64)
+    for row, feature in enumerate(features):
+        affinity = FEATURE_AFFINITIES.get(feature, DEFAULT_FEATURE_AFFINITY)
+        for column, dimension in enumerate(PROFILE_DIMENSIONS):
+            matrix[row, column] = affinity.get(dimension, 0.0)
+    matrix.setflags(write=False)
+    return matrix
+
+class InteractionColumns:
+    """Columnar view of an interaction history, sorted by timestamp
+    
+    Records are unpacked in a single pass into NumPy arrays (timestamp in
+    µs since the epoch, sender code, type code, content length, keyword
+    flags); every statistic is then computed with array operations.
+    """
+    
+    SENDERS = {"user": 0, "ai": 1}
+    NO_SENDER = -1
+    NO_TIMESTAMP = np.iinfo(np.int64).min  # sorts first, like datetime.min
+    EPOCH = datetime(1970, 1, 1)
+    
+    def __init__(self, interactions: List[Dict]):
+        count = len(interactions)
+        micros = np.empty(count, dtype=np.int64)
+        senders = np.empty(count, dtype=np.int8)
+        type_codes = np.empty(count, dtype=np.int32)
+        contents = [""] * count
+        type_ids: Dict[str, int] = {}
+        
+        one_micro = timedelta(microseconds=1)
+        for index, interaction in enumerate(interactions):
+            data = interaction.get("data") or {}
+            timestamp = as_datetime(interaction.get("timestamp"))
+            micros[index] = (
+                (timestamp - self.EPOCH) // one_micro
+                if timestamp is not None else self.NO_TIMESTAMP
+            )
+            senders[index] = self.SENDERS.get(data.get("sender"), self.NO_SENDER)
+            type_codes[index] = type_ids.setdefault(
+                interaction.get("type", "message"), len(type_ids)
+            )
+            contents[index] = data.get("content", "")
+            
+        order = np.argsort(micros, kind="stable")
+        self.micros = micros[order]
+        self.has_timestamp = self.micros != self.NO_TIMESTAMP
+        self.senders = senders[order]
+        self.type_codes = type_codes[order]
+        self.type_names = list(type_ids)
+        
+        lengths = np.fromiter(map(len, contents), dtype=np.int64, count=count)
+        self.lengths = lengths[order]
+        
+        # Lowercasing can change length (e.g. "İ"), so search the lowered text
+        lowered = [content.lower() for content in contents]
+        self.social = self._contains_any(lowered, SOCIAL_KEYWORDS)[order]
+        self.planning = self._contains_any(lowered, PLANNING_KEYWORDS)[order]
+        
+    @staticmethod
+    def _contains_any(lowered: List[str], keywords: List[str]) -> np.ndarray:
+        """Flag lowercased contents containing any keyword
+        
+        Searches all contents joined into one string, then maps match
+        positions back to records by their offsets.
+        """
+        
+        found = np.zeros(len(lowered), dtype=bool)
+        if not lowered:
+            return found
+            
+        text = "\n".join(lowered)
+        lengths = np.fromiter(map(len, lowered), dtype=np.int64, count=len(lowered))
+        ends = np.cumsum(lengths + 1)
+        pattern = re.compile("|".join(re.escape(k) for k in keywords))
+        positions = np.fromiter(
+            (m.start() for m in pattern.finditer(text)), dtype=np.int64
+        )
+        found[np.searchsorted(ends, positions, side="right")] = True
+        return found
+        
+    def __len__(self) -> int:
+        return len(self.senders)
+        
+    def to_profile_state(self) -> Dict:
+        """Compute the same state ``fold_interaction`` builds one by one"""
+        
+        state = new_profile_state()
+        count = len(self)
+        if not count:
+            return state
+            
+        state["interaction_count"] = count
+        type_counts = np.bincount(self.type_codes, minlength=len(self.type_names))
+        state["type_counts"] = {
+            name: int(n) for name, n in zip(self.type_names, type_counts) if n
+        }
+        
+        # Length statistics over user messages
+        is_user = self.senders == self.SENDERS["user"]
+        lengths = self.lengths[is_user].astype(np.float64)
+        if len(lengths):
+            state["user_message_count"] = int(len(lengths))
+            state["length_mean"] = float(lengths.mean())
+            state["length_m2"] = float(((lengths - lengths.mean()) ** 2).sum())
+            state["social_mentions"] = int(self.social[is_user].sum())
+            state["planning_mentions"] = int(self.planning[is_user].sum())
+            
+        hours = (self.micros[is_user & self.has_timestamp] // 3_600_000_000) % 24
+        state["hour_counts"] = np.bincount(hours, minlength=24).tolist()
+        
+        # Response times: user reply directly following an AI message,
+        # among records that have a sender
+        with_sender = self.senders != self.NO_SENDER
+        senders = self.senders[with_sender]
+        micros = self.micros[with_sender]
+        timed = micros != self.NO_TIMESTAMP
+        replies = (
+            (senders[1:] == self.SENDERS["user"])
+            & (senders[:-1] == self.SENDERS["ai"])
+            & timed[1:]
+            & timed[:-1]
+        )
+        response_times = (micros[1:] - micros[:-1])[replies] / 1e6
+        if len(response_times):
+            state["response_time_count"] = int(len(response_times))
+            state["response_time_mean"] = float(response_times.mean())
+            state["response_time_histogram"] = np.bincount(
+                np.searchsorted(RESPONSE_TIME_BUCKETS, response_times),
+                minlength=len(RESPONSE_TIME_BUCKETS) + 1
+            ).tolist()
+            
+        # Last-seen state lets incremental updates continue from here
+        if len(senders):
+            state["last_sender"] = "user" if senders[-1] == self.SENDERS["user"] else "ai"
+        if self.has_timestamp.any():
+            last = self.EPOCH + timedelta(microseconds=int(self.micros[-1]))
+            state["last_timestamp"] = last.isoformat()
+            
+        return state
+
+class PersonalizationEngine:
     """Adapts all AI interactions to individual user preferences and contexts"""
     
     def __init__(self, ml_models, data_store):
         self.ml_models = ml_models
         self.data_store = data_store
+        self._repair_task: Optional[asyncio.Task] = None
         
         # Personalization dimensions
         self.dimensions = {
@@ -1353,35 +2597,151 @@ class PersonalizationEngine:
         }
         
     async def get_user_profile(self, user_id: str) -> Dict:
-        """Get comprehensive user profile for personalization"""
+        """Get comprehensive user profile for personalization
+        
+        Built from the stored, incrementally maintained profile state; the
+        interaction history is only read when no usable state exists.
+        """
         
         # Get base user data
         user = await self.data_store.get_user(user_id)
         
-        # Get interaction history
-        interactions = await self.data_store.get_user_interactions(user_id)
+        state = await self.data_store.get_personalization_profile(user_id)
+        if state is None or state.get("schema") != PROFILE_SCHEMA_VERSION:
+            state = await self.rebuild_profile(user_id)
+            
+        return self._build_profile(user_id, user, state)
         
-        # Analyze patterns
-        patterns = await self._analyze_interaction_patterns(interactions)
+    def _build_profile(self, user_id: str, user: Any, state: Dict) -> Dict:
+        """Assemble a profile from user data and profile state"""
+        
+        patterns = self._patterns_from_state(state)
         
         # Build comprehensive profile
         profile = {
             "user_id": user_id,
+            "profile_version": state["version"],
             "demographics": user.demographics,
             "explicit_preferences": user.preferences,
             "inferred_preferences": patterns["preferences"],
             "behavioral_patterns": patterns["behaviors"],
             "engagement_profile": patterns["engagement"],
-            "personality_traits": await self._infer_personality_traits(
-                interactions, patterns
-            ),
-            "context_preferences": await self._analyze_context_preferences(
-                interactions
-            )
+            "personality_traits": self._traits_from_state(state),
+            "context_preferences": self._context_preferences_from_state(state)
         }
         
         return profile
         
+    async def record_interactions(self, user_id: str, messages: List[Any]):
+        """Fold newly saved messages into the user's stored profile state
+        
+        Messages at or before the state's ``last_timestamp`` are skipped:
+        a rebuild that ran after they were saved has already counted them.
+        """
+        
+        interactions = []
+        for message in messages:
+            data = message_to_dict(message)
+            interactions.append({
+                "type": "message",
+                "timestamp": data.get("timestamp"),
+                "data": data
+            })
+            
+        # Optimistic concurrency: retry on a concurrent update
+        for _ in range(3):
+            state = await self.data_store.get_personalization_profile(user_id)
+            if state is None or state.get("schema") != PROFILE_SCHEMA_VERSION:
+                # The rebuild reads history that already includes these messages
+                await self.rebuild_profile(user_id)
+                return
+                
+            last_folded = as_datetime(state["last_timestamp"])
+            new = [
+                interaction for interaction in interactions
+                if last_folded is None
+                or interaction["timestamp"] is None
+                or as_datetime(interaction["timestamp"]) > last_folded
+            ]
+            if not new:
+                return
+                
+            expected_version = state["version"]
+            for interaction in new:
+                fold_interaction(state, interaction)
+            state["version"] = expected_version + 1
+            
+            if await self.data_store.save_personalization_profile(
+                user_id, state, expected_version
+            ):
+                return
+                
+        logger.warning(f"Profile update for {user_id} lost to concurrent writers, rebuilding")
+        await self.rebuild_profile(user_id)
+        
+    async def rebuild_profile(self, user_id: str) -> Dict:
+        """Recompute a user's profile state from full interaction history"""
+        
+        for _ in range(3):
+            # Read the version before the history, so an incremental update
+            # landing in between fails our save instead of being overwritten
+            current = await self.data_store.get_personalization_profile(user_id)
+            expected_version = current["version"] if current is not None else None
+            
+            interactions = await self.data_store.get_user_interactions(
+                user_id, limit=None
+            )
+            state = await self._analyze_interaction_patterns(interactions)
+            state["version"] = (expected_version or 0) + 1
+            state["rebuilt_at"] = time.time()
+            
+            if await self.data_store.save_personalization_profile(
+                user_id, state, expected_version
+            ):
+                return state
+                
+        logger.warning(f"Profile rebuild for {user_id} lost to concurrent writers")
+        return state
+        
+    async def repair_profiles(self, max_age: int = config.profile_repair_interval) -> int:
+        """Periodic job: rebuild profiles not recomputed within ``max_age`` seconds"""
+        
+        cutoff = time.time() - max_age
+        rebuilt = 0
+        for user_id in await self.data_store.get_user_ids():
+            state = await self.data_store.get_personalization_profile(user_id)
+            if state is None or (state.get("rebuilt_at") or 0) < cutoff:
+                await self.rebuild_profile(user_id)
+                rebuilt += 1
+                
+        logger.info(f"Rebuilt {rebuilt} personalization profiles")
+        return rebuilt
+        
+    async def start(self):
+        """Start the periodic profile repair job"""
+        
+        if self._repair_task is None:
+            self._repair_task = asyncio.create_task(self._repair_loop())
+            
+    async def stop(self):
+        """Stop the profile repair job"""
+        
+        if self._repair_task is not None:
+            self._repair_task.cancel()
+            try:
+                await self._repair_task
+            except asyncio.CancelledError:
+                pass
+            self._repair_task = None
+            
+    async def _repair_loop(self):
+        while True:
+            await asyncio.sleep(config.profile_repair_check_interval)
+            try:
+                await self.repair_profiles()
+            except Exception as e:
+                logger.error(f"Profile repair failed, will retry: {e!r}")
+        
     async def personalize_content(
         self,
         content: Any,
@@ -1476,35 +2836,143 @@ class PersonalizationEngine:
     async def recommend_features(
         self,
         user_id: str,
-        available_features: List[str]
+        available_features: List[str],
+        limit: int = 5
     ) -> List[Dict]:
         """Recommend features based on user profile"""
         
         profile = await self.get_user_profile(user_id)
         
-        # Score features based on profile
-        feature_scores = []
+        users = self._profile_vector(profile)[np.newaxis, :]
+        return self._rank_features(users, available_features, limit)[0]
         
-        for feature in available_features:
-            score = await self._score_feature_for_user(feature, profile)
-            feature_scores.append({
-                "feature": feature,
-                "score": score,
-                "reason": await self._get_recommendation_reason(
-                    feature, profile, score
-                )
-            })
+    async def recommend_features_batch(
+        self,
+        available_features: List[str],
+        user_ids: Optional[List[str]] = None,
+        limit: int = 5,
+        chunk_size: int = 10000
+    ) -> Dict[str, List[Dict]]:
+        """Recommend features for many users, e.g. the nightly home feed
+        
+        Scores each chunk of users against all features with one matrix
+        product. ``user_ids`` defaults to every stored user; unknown users
+        are skipped. Users and profile states are loaded in bulk per chunk;
+        users without a usable stored state are scored from an empty one
+        (the repair job rebuilds them) rather than rebuilt here.
+        """
+        
+        if user_ids is None:
+            user_ids = await self.data_store.get_user_ids()
             
-        # Sort by score
-        feature_scores.sort(key=lambda x: x["score"], reverse=True)
+        recommendations = {}
+        for offset in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[offset:offset + chunk_size]
+            users, states = await asyncio.gather(
+                self.data_store.get_users(set(chunk)),
+                self.data_store.get_personalization_profiles(chunk)
+            )
+            
+            chunk = [user_id for user_id in chunk if user_id in users]
+            if not chunk:
+                continue
+            vectors = []
+            for user_id in chunk:
+                state = states.get(user_id)
+                if state is None or state.get("schema") != PROFILE_SCHEMA_VERSION:
+                    state = new_profile_state()
+                vectors.append(self._profile_vector(
+                    self._build_profile(user_id, users[user_id], state)
+                ))
+                
+            ranked = self._rank_features(np.stack(vectors), available_features, limit)
+            recommendations.update(zip(chunk, ranked))
+            
+        return recommendations
+        
+    def _profile_vector(self, profile: Dict) -> np.ndarray:
+        """Encode a profile along ``PROFILE_DIMENSIONS``"""
+        
+        traits = profile["personality_traits"]
+        detail_level = profile["explicit_preferences"].get(
+            "detail_level", profile["inferred_preferences"].get("detail_level")
+        )
+        hours = profile["context_preferences"].get("preferred_hours", [])
+        
+        values = {
+            "extraversion": traits.get("extraversion", 0.0),
+            "conscientiousness": traits.get("conscientiousness", 0.0),
+            "detail_high": float(detail_level == "high"),
+            "detail_low": float(detail_level == "low"),
+            "engagement_high": float(
+                profile["engagement_profile"].get("engagement_level") == "high"
+            ),
+            "visual_learner": float(
+                profile["explicit_preferences"].get("learning_style") == "visual"
+            ),
+            "morning_user": float(any(5 <= hour < 12 for hour in hours)),
+            "evening_user": float(any(hour >= 18 for hour in hours)),
+            "baseline": 1.0
+        }
+        return np.array([values[d] for d in PROFILE_DIMENSIONS], dtype=np.float64)
+        
+    def _rank_features(
+        self,
+        users: np.ndarray,
+        features: List[str],
+        limit: int
+    ) -> List[List[Dict]]:
+        """Top ``limit`` features per user row, best first, with reasons"""
+        
+        if not features:
+            return [[] for _ in range(len(users))]
+            
+        matrix = feature_matrix(tuple(features))
+        scores = users @ matrix.T  # (users x features)
+        
+        # Partial selection of the top k, then sort only those k
+        k = min(limit, len(features))
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        
+        # Reason: the dimension contributing most to each chosen score,
+        # or the baseline reason when nothing contributes
+        contributions = matrix[top] * users[:, np.newaxis, :]
+        reasons = np.where(
+            contributions.max(axis=2) > 0,
+            contributions.argmax(axis=2),
+            PROFILE_DIMENSIONS.index("baseline")
+        )
         
-        return feature_scores[:5]  # Top 5 recommendations
+        return [
+            [
+                {
+                    "feature": features[feature],
+                    "score": float(score),
+                    "reason": RECOMMENDATION_REASONS[PROFILE_DIMENSIONS[reason]]
+                }
+                for feature, score, reason in zip(feature_row, score_row, reason_row)
+            ]
+            for feature_row, score_row, reason_row in zip(top, top_scores, reasons)
+        ]
         
     async def _analyze_interaction_patterns(
         self,
         interactions: List[Dict]
     ) -> Dict:
-        """Analyze user interaction patterns"""
+        """Compute profile state from a full interaction history
+        
+        Vectorized over columnar arrays so repair jobs scale to millions
+        of interactions.
+        """
+        
+        return InteractionColumns(interactions).to_profile_state()
+        
+    def _patterns_from_state(self, state: Dict) -> Dict:
+        """Derive preference, behavior and engagement patterns from state"""
         
         patterns = {
             "preferences": {},
@@ -1512,77 +2980,74 @@ class PersonalizationEngine:
             "engagement": {}
         }
         
-        if not interactions:
+        if not state["interaction_count"]:
             return patterns
             
         # Analyze communication preferences
-        message_lengths = [len(i.get("message", "")) for i in interactions]
-        avg_length = np.mean(message_lengths) if message_lengths else 0
-        
-        if avg_length < 50:
-            patterns["preferences"]["detail_level"] = "low"
-        elif avg_length > 200:
-            patterns["preferences"]["detail_level"] = "high"
-        else:
-            patterns["preferences"]["detail_level"] = "medium"
-            
-        # Analyze engagement patterns
-        response_times = []
-        for i, interaction in enumerate(interactions[1:]):
-            if interactions[i]["type"] == "ai_message":
-                time_diff = (
-                    interaction["timestamp"] - interactions[i]["timestamp"]
-                ).total_seconds()
-                response_times.append(time_diff)
+        if state["user_message_count"]:
+            avg_length = state["length_mean"]
+            patterns["behaviors"]["message_length"] = {
+                "mean": avg_length,
+                "std": float(np.sqrt(state["length_m2"] / state["user_message_count"]))
+            }
+            if avg_length < 50:
+                patterns["preferences"]["detail_level"] = "low"
+            elif avg_length > 200:
+                patterns["preferences"]["detail_level"] = "high"
+            else:
+                patterns["preferences"]["detail_level"] = "medium"
                 
-        if response_times:
-            avg_response_time = np.mean(response_times)
+        # Analyze engagement patterns
+        if state["response_time_count"]:
+            avg_response_time = state["response_time_mean"]
             patterns["engagement"]["avg_response_time"] = avg_response_time
             patterns["engagement"]["engagement_level"] = (
                 "high" if avg_response_time < 60 else "medium"
             )
             
+            # Share of replies within each response-time bucket
+            histogram = np.array(state["response_time_histogram"], dtype=np.float64)
+            labels = [f"<={edge}s" for edge in RESPONSE_TIME_BUCKETS]
+            labels.append(f">{RESPONSE_TIME_BUCKETS[-1]}s")
+            patterns["engagement"]["response_time_distribution"] = dict(
+                zip(labels, (histogram / histogram.sum()).tolist())
+            )
+            
         # Analyze behavioral patterns
-        interaction_types = [i.get("type") for i in interactions]
-        patterns["behaviors"]["preferred_interactions"] = self._get_most_common(
-            interaction_types
-        )
+        patterns["behaviors"]["preferred_interactions"] = Counter(
+            state["type_counts"]
+        ).most_common(1)[0][0]
         
         return patterns
         
-    async def _infer_personality_traits(
-        self,
-        interactions: List[Dict],
-        patterns: Dict
-    ) -> Dict:
-        """Infer personality traits from interactions"""
+    def _traits_from_state(self, state: Dict) -> Dict:
+        """Infer personality traits from keyword mention rates"""
         
         traits = {}
         
-        # Analyze language use for personality indicators
-        if interactions:
+        count = state["user_message_count"]
+        if count:
             # Extraversion indicator: frequency of social references
-            social_keywords = ["team", "together", "group", "friends", "community"]
-            social_mentions = sum(
-                1 for i in interactions 
-                if any(keyword in i.get("message", "").lower() 
-                      for keyword in social_keywords)
-            )
-            traits["extraversion"] = min(social_mentions / len(interactions), 1.0)
+            traits["extraversion"] = min(state["social_mentions"] / count, 1.0)
             
             # Conscientiousness indicator: goal and planning references
-            planning_keywords = ["plan", "schedule", "goal", "track", "progress"]
-            planning_mentions = sum(
-                1 for i in interactions 
-                if any(keyword in i.get("message", "").lower() 
-                      for keyword in planning_keywords)
-            )
-            traits["conscientiousness"] = min(
-                planning_mentions / len(interactions), 1.0
-            )
+            traits["conscientiousness"] = min(state["planning_mentions"] / count, 1.0)
             
         return traits
         
+    def _context_preferences_from_state(self, state: Dict) -> Dict:
+        """Get the hours of day the user usually messages"""
+        
+        hour_counts = state["hour_counts"]
+        if not any(hour_counts):
+            return {}
+            
+        active_hours = sorted(
+            (hour for hour in range(24) if hour_counts[hour]),
+            key=lambda hour: -hour_counts[hour]
+        )
+        return {"preferred_hours": active_hours[:3]}
+        
     async def _personalize_message(
         self,
         message: str,
@@ -1648,19 +3113,36 @@ class PersonalizationEngine:
 # === core/engagement_manager.py ===
 """Engagement Manager for optimizing user engagement"""
 
+import asyncio
 import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
 import numpy as np
 
+from coach_core_ai.config import config
+from coach_core_ai.services.ml_models import (
+    churn_factors,
+    init_churn_worker,
+    score_churn_chunk
+)
+
 logger = logging.getLogger(__name__)
 
+# Lower bounds of churn risk levels
+CHURN_RISK_THRESHOLDS = [0.3, 0.5, 0.7]
+CHURN_RISK_LEVELS = ["low", "medium", "high", "critical"]
+
 class EngagementManager:
     """Manages user engagement strategies and timing"""
     
-    def __init__(self, ml_models, data_store):
+    def __init__(self, ml_models, data_store, notification_scheduler=None):
         self.ml_models = ml_models
         self.data_store = data_store
+        self.notification_scheduler = notification_scheduler
+        self._churn_task: Optional[asyncio.Task] = None
         
         # Engagement strategies
         self.strategies = {
@@ -1709,28 +3191,173 @@ class EngagementManager:
     async def predict_churn_risk(self, user_id: str) -> Dict:
         """Predict user churn risk"""
         
-        # Get user activity data
-        activity = await self.data_store.get_user_activity(user_id, days=30)
-        
-        # Extract features for churn prediction
-        features = await self._extract_churn_features(activity)
+        # Same features the daily batch job scores
+        features = await self.data_store.get_churn_features(
+            days=30, user_ids=[user_id]
+        )
         
         # Get prediction from ML model
-        prediction = await self.ml_models.predict_churn(features)
+        prediction = await self.ml_models.predict_churn(features[user_id])
+        
+        return await self._churn_risk_response(
+            user_id,
+            prediction["risk_score"],
+            prediction["contributing_factors"],
+            datetime.utcnow().isoformat()
+        )
+        
+    async def get_churn_risk(self, user_id: str) -> Dict:
+        """Get a user's churn risk from the daily table, scoring live if absent"""
+        
+        stored = await self.data_store.get_churn_score(user_id)
+        if stored is None:
+            return await self.predict_churn_risk(user_id)
+            
+        return await self._churn_risk_response(
+            user_id,
+            stored["risk_score"],
+            stored["factors"],
+            stored["scored_at"]
+        )
+        
+    async def _churn_risk_response(
+        self,
+        user_id: str,
+        risk_score: float,
+        factors: List[str],
+        scored_at: str
+    ) -> Dict:
+        """Build the churn risk response, with retention strategies if high risk"""
         
-        # Generate retention strategies if high risk
         retention_strategies = []
-        if prediction["risk_score"] > 0.7:
+        if risk_score > 0.7:
             retention_strategies = await self._generate_retention_strategies(
-                user_id, prediction
+                user_id,
+                {"risk_score": risk_score, "contributing_factors": factors}
             )
             
         return {
-            "risk_score": prediction["risk_score"],
-            "risk_level": self._get_risk_level(prediction["risk_score"]),
-            "factors": prediction["contributing_factors"],
-            "retention_strategies": retention_strategies
+            "risk_score": risk_score,
+            "risk_level": self._get_risk_level(risk_score),
+            "factors": factors,
+            "retention_strategies": retention_strategies,
+            "scored_at": scored_at
+        }
+        
+    async def score_churn_for_all_users(
+        self,
+        chunk_size: int = config.churn_batch_chunk_size,
+        workers: int = config.churn_batch_workers
+    ) -> Dict:
+        """Daily job: score every user's churn risk and store the results
+        
+        Builds the feature matrix for all users in one pass over the data
+        store, scores it in chunks on a process pool (the model is shipped
+        to each worker once) and writes risk scores, levels and
+        contributing factors to the churn score table.
+        """
+        
+        started = time.perf_counter()
+        
+        features = await self.data_store.get_churn_features(days=30)
+        user_ids = list(features)
+        if not user_ids:
+            return {"scored": 0, "levels": {}, "seconds": 0.0}
+            
+        # Matrix building and factor extraction are O(users); keep them off the loop
+        loop = asyncio.get_running_loop()
+        X = await loop.run_in_executor(
+            None,
+            self.ml_models.churn_feature_matrix,
+            [features[u] for u in user_ids]
+        )
+        chunks = [X[i:i + chunk_size] for i in range(0, len(X), chunk_size)]
+        
+        # Spawn, not fork: the API process has NLP and torch threads running
+        pool = ProcessPoolExecutor(
+            max_workers=min(workers, len(chunks)),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_churn_worker,
+            initargs=(
+                self.ml_models.models["churn_prediction"],
+                self.ml_models.scalers["churn"]
+            )
+        )
+        try:
+            results = await asyncio.gather(*[
+                loop.run_in_executor(pool, score_churn_chunk, chunk)
+                for chunk in chunks
+            ])
+        finally:
+            # Joining the workers blocks, so do it on a thread
+            await loop.run_in_executor(None, pool.shutdown)
+            
+        risk_scores = np.concatenate(results)
+        level_ids = np.searchsorted(CHURN_RISK_THRESHOLDS, risk_scores, side="right")
+        factors = await loop.run_in_executor(None, churn_factors, X)
+        scored_at = datetime.utcnow().isoformat()
+        
+        await self.data_store.save_churn_scores({
+            user_id: {
+                "risk_score": float(score),
+                "risk_level": CHURN_RISK_LEVELS[level],
+                "factors": user_factors,
+                "scored_at": scored_at
+            }
+            for user_id, score, level, user_factors in zip(
+                user_ids, risk_scores, level_ids, factors
+            )
+        })
+        
+        level_counts = np.bincount(level_ids, minlength=len(CHURN_RISK_LEVELS))
+        summary = {
+            "scored": len(user_ids),
+            "levels": dict(zip(CHURN_RISK_LEVELS, level_counts.tolist())),
+            "seconds": time.perf_counter() - started
         }
+        logger.info(f"Churn scoring complete: {summary}")
+        return summary
+        
+    async def start(self):
+        """Start the daily churn scoring job"""
+        
+        if self._churn_task is None:
+            self._churn_task = asyncio.create_task(self._churn_loop())
+            
+    async def stop(self):
+        """Stop the daily churn scoring job"""
+        
+        if self._churn_task is not None:
+            self._churn_task.cancel()
+            try:
+                await self._churn_task
+            except asyncio.CancelledError:
+                pass
+            self._churn_task = None
+            
+    async def _churn_loop(self):
+        while True:
+            await asyncio.sleep(self._seconds_until_hour(config.churn_scoring_hour))
+            try:
+                await self.score_churn_for_all_users()
+            except Exception as e:
+                logger.error(f"Daily churn scoring failed: {e!r}")
+                
+    @staticmethod
+    def _seconds_until_hour(hour: int) -> float:
+        """Seconds until the next occurrence of ``hour``:00 UTC"""
+        
+        now = datetime.utcnow()
+        next_run = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+        if next_run <= now:
+            next_run += timedelta(days=1)
+        return (next_run - now).total_seconds()
+        
+    def _get_risk_level(self, risk_score: float) -> str:
+        """Map a churn risk score to its level"""
+        
+        level = int(np.searchsorted(CHURN_RISK_THRESHOLDS, risk_score, side="right"))
+        return CHURN_RISK_LEVELS[level]
         
     async def optimize_notification_timing(
         self,
@@ -1764,6 +3391,29 @@ class EngagementManager:
             "reason": optimal_time["reasoning"]
         }
         
+    async def schedule_notification(
+        self,
+        user_id: str,
+        notification_type: str,
+        content: Dict
+    ) -> str:
+        """Queue a notification for its optimal time, returning its ID
+        
+        The scheduler enforces ``min_engagement_interval`` and
+        ``max_daily_notifications``, deferring delivery if needed.
+        """
+        
+        timing = await self.optimize_notification_timing(user_id, notification_type)
+        send_at = timing["optimal_time"]
+        if isinstance(send_at, datetime):
+            send_at = send_at.timestamp()
+            
+        return self.notification_scheduler.schedule(
+            user_id,
+            {"type": notification_type, **content},
+            send_at=send_at
+        )
+        
     async def analyze_engagement_metrics(
         self,
         user_id: str,
@@ -2290,263 +3940,2867 @@ class LearningModule:
 # === services/nlp_service.py ===
 """NLP Service for natural language processing"""
 
+import asyncio
 import logging
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import copy
+import hashlib
+import os
 import re
-from transformers import pipeline, AutoTokenizer, AutoModelForSequenceClassification
+import threading
+import time
+import joblib
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+import torch
+from transformers import pipeline, AutoModel, AutoTokenizer, AutoModelForSequenceClassification
 import spacy
 import nltk
 from nltk.sentiment import SentimentIntensityAnalyzer
 
+from coach_core_ai.config import config
+from coach_core_ai.services.typo_corrector import COACHING_VOCABULARY, TypoCorrector
+from coach_core_ai.services.batch_sentiment import BatchSentimentScorer
+
 logger = logging.getLogger(__name__)
 
-class NLPService:
-    """Handles all NLP operations"""
+# spaCy components not needed for NER (only doc.ents is read)
+SPACY_UNUSED_COMPONENTS = [
+    "tagger", "parser", "attribute_ruler", "lemmatizer", "senter"
+]
+
+# Confidence assigned to compiled pattern intent matches
+PATTERN_INTENT_CONFIDENCE = 0.9
+
+# Supported intent classifier quantization modes
+QUANTIZATION_MODES = ("none", "dynamic_int8")
+
+def build_intent_classifier(
+    model_name: Optional[str] = None,
+    quantization: Optional[str] = None
+):
+    """Build CPU text-classification pipeline for intents
     
-    def __init__(self):
-        logger.info("Initializing NLP Service...")
+    ``quantization="dynamic_int8"`` applies PyTorch dynamic quantization to
+    the model's Linear layers. A distilled checkpoint can be selected through
+    ``model_name`` (or ``AIConfig.nlp_model``) and combined with either mode.
+    """
+    
+    model_name = model_name or config.nlp_model
+    quantization = quantization or config.nlp_quantization
+    
+    if quantization not in QUANTIZATION_MODES:
+        raise ValueError(
+            f"Unknown quantization mode '{quantization}', "
+            f"expected one of {QUANTIZATION_MODES}"
+        )
         
-        # Initialize models
-        self.sentiment_analyzer = SentimentIntensityAnalyzer()
-        self.intent_classifier = pipeline(
-            "text-classification",
-            model="bert-base-uncased"
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name)
+    model.eval()
+    
+    if quantization == "dynamic_int8":
+        model = torch.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
         )
         
-        # Load spaCy model for entity extraction
-        self.nlp = spacy.load("en_core_web_sm")
+    logger.info(f"Loaded intent classifier {model_name} (quantization={quantization})")
+    
+    return pipeline(
+        "text-classification",
+        model=model,
+        tokenizer=tokenizer,
+        device=-1
+    )
+
+class HashedNgramIntentModel:
+    """Tiny linear intent classifier over hashed word n-grams"""
+    
+    def __init__(self, n_features: int = 2 ** 18):
+        self.vectorizer = HashingVectorizer(
+            n_features=n_features,
+            ngram_range=(1, 2),
+            alternate_sign=False
+        )
+        self.classifier = SGDClassifier(
+            loss="log_loss",
+            alpha=1e-5,
+            random_state=42
+        )
+        self.is_fitted = False
         
-        # Intent mappings
-        self.intent_patterns = {
-            "workout_recommendation": [
-                r"recommend.*workout",
-                r"suggest.*exercise",
-                r"what.*workout.*should"
-            ],
-            "progress_check": [
-                r"how.*doing",
-                r"check.*progress",
-                r"show.*progress"
-            ],
-            "meal_planning": [
-                r"plan.*meal",
-                r"what.*eat",
-                r"food.*suggestion"
-            ],
-            "goal_setting": [
-                r"set.*goal",
-                r"create.*goal",
-                r"new.*goal"
-            ]
-        }
+    def fit(self, texts: List[str], labels: List[str]) -> "HashedNgramIntentModel":
+        """Fit classifier on labeled messages"""
         
-    async def analyze_message(self, message: str) -> Dict:
-        """Analyze message for intent, entities, and sentiment"""
+        self.classifier.fit(self.vectorizer.transform(texts), labels)
+        self.is_fitted = True
+        return self
         
-        # Clean message
-        cleaned_message = self._clean_text(message)
+    def predict(self, texts: List[str]) -> List[Dict]:
+        """Predict intent label and probability for each message"""
         
-        # Get intent
-        intent = await self._classify_intent(cleaned_message)
+        probabilities = self.classifier.predict_proba(
+            self.vectorizer.transform(texts)
+        )
+        best = probabilities.argmax(axis=1)
         
-        # Extract entities
-        entities = await self._extract_entities(cleaned_message)
+        return [
+            {
+                "label": str(self.classifier.classes_[label_index]),
+                "confidence": float(row[label_index])
+            }
+            for row, label_index in zip(probabilities, best)
+        ]
         
-        # Analyze sentiment
-        sentiment = self._analyze_sentiment(cleaned_message)
+    def save(self, path: str):
+        """Persist fitted model"""
         
-        # Calculate confidence
-        confidence = await self._calculate_confidence(
-            intent, entities, sentiment
-        )
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        joblib.dump(self, path)
         
-        return {
-            "intent": intent["label"],
-            "intent_confidence": intent["confidence"],
-            "entities": entities,
-            "sentiment": sentiment,
-            "confidence": confidence
-        }
+    @classmethod
+    def load(cls, path: str) -> Optional["HashedNgramIntentModel"]:
+        """Load fitted model, or None if none has been trained"""
         
-    async def generate_response(
-        self,
-        template: str,
-        parameters: Dict
-    ) -> str:
-        """Generate natural language response from template"""
+        if not os.path.exists(path):
+            logger.info(f"No linear intent model at {path}, tier disabled")
+            return None
+        return joblib.load(path)
+
+class SemanticAnswerIndex:
+    """Bounded nearest-neighbour index of answered questions
+    
+    Embeddings are L2-normalized and kept in a preallocated NumPy matrix,
+    so a lookup is one matrix-vector product (cosine similarity). Once
+    full, the oldest entries are overwritten.
+    """
+    
+    def __init__(self, dim: int, max_size: int):
+        self.dim = dim
+        self.max_size = max_size
+        self.vectors = np.zeros((max_size, dim), dtype=np.float32)
+        self.entries: List[Optional[Dict]] = [None] * max_size
+        self.size = 0
+        self._next_slot = 0
+        self._lock = threading.Lock()
+        
+    def add(self, vector: np.ndarray, entry: Dict):
+        """Add answered question embedding and its stored answer"""
+        
+        if self.max_size <= 0:
+            return
+            
+        with self._lock:
+            slot = self._next_slot
+            self.vectors[slot] = vector
+            self.entries[slot] = copy.deepcopy(entry)
+            self._next_slot = (slot + 1) % self.max_size
+            self.size = min(self.size + 1, self.max_size)
+            
+    def search(self, vector: np.ndarray, threshold: float) -> Optional[Dict]:
+        """Get stored answer of the closest question above threshold"""
         
-        # Fill template with parameters
-        response = template
-        for key, value in parameters.items():
-            placeholder = f"{{{key}}}"
-            if placeholder in response:
-                response = response.replace(placeholder, str(value))
+        with self._lock:
+            if self.size == 0:
+                return None
                 
-        # Post-process for natural flow
-        response = self._improve_fluency(response)
+            scores = self.vectors[:self.size] @ vector
+            best = int(np.argmax(scores))
+            if scores[best] < threshold:
+                return None
+                
+            entry = copy.deepcopy(self.entries[best])
+            
+        entry["similarity"] = float(scores[best])
+        return entry
         
-        return response
+    def clear(self):
+        """Drop all indexed answers"""
+        
+        with self._lock:
+            self.entries = [None] * self.max_size
+            self.size = 0
+            self._next_slot = 0
+
+class CompiledTemplate:
+    """Response template split once into literal text and placeholder names"""
+    
+    PLACEHOLDER = re.compile(r"\{(\w+)\}")
+    
+    def __init__(self, template: str):
+        # Even indices are literal text, odd indices are placeholder names
+        self.parts = self.PLACEHOLDER.split(template)
+        
+    def render(self, parameters: Dict) -> str:
+        """Fill placeholders in one pass, leaving unknown ones untouched"""
+        
+        parts = list(self.parts)
+        for i in range(1, len(parts), 2):
+            name = parts[i]
+            parts[i] = str(parameters[name]) if name in parameters else f"{{{name}}}"
+        return "".join(parts)
+
+@lru_cache(maxsize=1024)
+def compile_template(template: str) -> CompiledTemplate:
+    """Get compiled template, cached by template text"""
+    return CompiledTemplate(template)
+
+class ToneTransform:
+    """Replacement table compiled into a single word-boundary regex"""
+    
+    def __init__(self, replacements: Dict[str, str]):
+        self.replacements = {k.lower(): v for k, v in replacements.items()}
+        
+        # Words match on word boundaries, punctuation matches anywhere
+        alternatives = [
+            rf"\b{re.escape(word)}\b" if word[0].isalnum() else re.escape(word)
+            for word in sorted(self.replacements, key=len, reverse=True)
+        ]
+        self.pattern = re.compile("|".join(alternatives), re.IGNORECASE)
+        
+    def apply(self, text: str) -> str:
+        """Apply all replacements in one pass"""
+        return self.pattern.sub(self._replace, text)
+        
+    def _replace(self, match) -> str:
+        word = match.group(0)
+        replacement = self.replacements[word.lower()]
+        return replacement.capitalize() if word[:1].isupper() else replacement
+
+PROFESSIONAL_TONE = ToneTransform({
+    "hey": "hello",
+    "hi": "greetings",
+    "awesome": "excellent",
+    "cool": "beneficial",
+    "!": "."
+})
+
+def bucket_by_length(
+    lengths: List[int],
+    batch_size: int,
+    bucket_width: int
+) -> List[List[int]]:
+    """Group sequence indices into batches of similar token length
+    
+    Indices are bucketed by ``ceil(length / bucket_width)`` and each bucket
+    is split into batches of at most ``batch_size``, so padding within a
+    batch never exceeds ``bucket_width`` tokens.
+    """
+    
+    buckets: Dict[int, List[int]] = {}
+    for index, length in enumerate(lengths):
+        buckets.setdefault(-(-length // bucket_width), []).append(index)
+        
+    batches = []
+    for key in sorted(buckets):
+        indices = buckets[key]
+        for start in range(0, len(indices), batch_size):
+            batches.append(indices[start:start + batch_size])
+            
+    return batches
+
+def matcher_terms(
+    intent_patterns: Dict[str, List[str]],
+    domain_keywords: Dict[str, List[str]]
+) -> List[str]:
+    """Literal words the intent patterns and domain keywords match on
+    
+    These must survive typo correction untouched, so they are added to
+    the correction vocabulary.
+    """
+    
+    terms = [k for keywords in domain_keywords.values() for k in keywords]
+    for patterns in intent_patterns.values():
+        for pattern in patterns:
+            # Drop escapes like \s so only literal words remain
+            terms.extend(re.findall(r"[a-z]+", re.sub(r"\\.", " ", pattern)))
+    return sorted(set(terms))
+
+def load_spacy_ner(model_name: Optional[str] = None):
+    """Load spaCy model with only the components NER depends on"""
+    return spacy.load(
+        model_name or config.spacy_model,
+        exclude=SPACY_UNUSED_COMPONENTS
+    )
+
+# Exercise types recognised as custom entities
+EXERCISE_TYPES = [
+    "cardio", "strength", "yoga", "pilates", "hiit",
+    "running", "cycling", "swimming"
+]
+
+# Domain keywords mapping
+DOMAIN_KEYWORDS = {
+    "fitness": ["fitness", "workout", "exercise", "training", "gym", "cardio", "strength"],
+    "nutrition": ["diet", "food", "meal", "calories", "nutrition", "eating"],
+    "mental_wellness": ["stress", "anxiety", "mood", "meditation", "mindfulness", "mental"],
+    "productivity": ["goals", "tasks", "schedule", "focus", "time", "productivity"]
+}
+
+class MessageMatcher:
+    """Precompiled matcher for intents, exercise entities and domain keywords
+    
+    Intent patterns are folded into one regex with a named group per intent,
+    and exercise/domain keywords into one whole-word alternation, so a
+    message is lowercased once and scanned once per expression instead of
+    once per pattern.
+    """
+    
+    def __init__(
+        self,
+        intent_patterns: Dict[str, List[str]],
+        exercises: List[str],
+        domain_keywords: Dict[str, List[str]]
+    ):
+        self.intents = list(intent_patterns)
+        self.intent_regex = re.compile("|".join(
+            f"(?P<{intent}>{'|'.join(f'(?:{p})' for p in patterns)})"
+            for intent, patterns in intent_patterns.items()
+        ))
+        
+        # Keyword -> ("exercise" | domain) labels it contributes
+        self.keyword_labels: Dict[str, List[str]] = {}
+        for exercise in exercises:
+            self.keyword_labels.setdefault(exercise, []).append("exercise")
+            self.keyword_labels[exercise].append("fitness")
+        for domain, keywords in domain_keywords.items():
+            for keyword in keywords:
+                labels = self.keyword_labels.setdefault(keyword, [])
+                if domain not in labels:
+                    labels.append(domain)
+                    
+        # Whole words only, so "time" doesn't match "times"
+        keywords = sorted(self.keyword_labels, key=len, reverse=True)
+        self.keyword_regex = re.compile(
+            r"\b(" + "|".join(re.escape(k) for k in keywords) + r")\b"
+        )
+        
+    def match(self, text: str) -> Dict:
+        """Match intent, exercise entities and domain hits in one pass"""
+        
+        lowered = text.lower()
+        
+        intent_match = self.intent_regex.search(lowered)
+        intent = intent_match.lastgroup if intent_match else None
+        
+        # Domain hit counts, in order of first mention
+        exercises: List[str] = []
+        domains: Dict[str, int] = {}
+        for match in self.keyword_regex.finditer(lowered):
+            for label in self.keyword_labels[match.group(1)]:
+                if label == "exercise":
+                    if match.group(1) not in exercises:
+                        exercises.append(match.group(1))
+                else:
+                    domains[label] = domains.get(label, 0) + 1
+                    
+        return {
+            "intent": intent,
+            "exercises": exercises,
+            "domains": domains
+        }
+
+class AnalysisCache:
+    """Bounded LRU cache of message analyses with per-entry TTL
+    
+    ``generation`` increases on every ``clear``; analyses started under an
+    older generation are not stored, so a reload can't be undone by
+    requests that were already in flight.
+    """
+    
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.generation = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        
+    @staticmethod
+    def make_key(cleaned_text: str) -> str:
+        """Build cache key from normalized message text"""
+        return hashlib.blake2b(
+            cleaned_text.encode("utf-8"), digest_size=16
+        ).hexdigest()
+        
+    def get(self, key: str) -> Optional[Dict]:
+        """Get cached analysis, refreshing its LRU position"""
+        
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+            
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+            
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return copy.deepcopy(value)
+        
+    def put(self, key: str, value: Dict, generation: Optional[int] = None):
+        """Store analysis, evicting least recently used entries
+        
+        Skipped if ``generation`` (captured when the analysis started) is
+        older than the cache's current generation.
+        """
+        
+        if self.max_size <= 0:
+            return
+        if generation is not None and generation != self.generation:
+            return
+            
+        self._entries[key] = (time.monotonic() + self.ttl, copy.deepcopy(value))
+        self._entries.move_to_end(key)
+        
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+            
+    def clear(self):
+        """Drop all cached analyses and start a new generation"""
+        self.generation += 1
+        self._entries.clear()
+        
+    def stats(self) -> Dict:
+        """Get cache size and hit-rate metrics"""
+        
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+class NLPService:
+    """Handles all NLP operations"""
+    
+    def __init__(self):
+        logger.info("Initializing NLP Service...")
+        
+        # Initialize models
+        self.sentiment_analyzer = SentimentIntensityAnalyzer()
+        self.batch_sentiment = BatchSentimentScorer(self.sentiment_analyzer)
+        self.intent_classifier = build_intent_classifier()
+        self.intent_linear_model = HashedNgramIntentModel.load(
+            config.intent_linear_model_path
+        )
+        
+        # Sentence encoder and index of promoted answers, only when reuse is on
+        self.sentence_tokenizer = None
+        self.sentence_encoder = None
+        self.answer_index = None
+        if config.enable_semantic_answer_reuse:
+            self._load_sentence_encoder()
+        
+        # Intent cascade tier counters
+        self.intent_tier_counts = {
+            "pattern": 0,
+            "linear": 0,
+            "transformer": 0,
+            "fallback": 0
+        }
+        self._tier_lock = threading.Lock()
+        
+        # Load trimmed spaCy model for entity extraction
+        self.nlp = load_spacy_ner()
+        
+        # Executor for blocking model inference (BERT, spaCy, VADER)
+        self.executor = ThreadPoolExecutor(
+            max_workers=config.nlp_executor_workers,
+            thread_name_prefix="nlp"
+        )
+        
+        # Intent mappings
+        self.intent_patterns = {
+            "workout_recommendation": [
+                r"recommend.*workout",
+                r"suggest.*exercise",
+                r"what.*workout.*should"
+            ],
+            "progress_check": [
+                r"how.*doing",
+                r"check.*progress",
+                r"show.*progress"
+            ],
+            "meal_planning": [
+                r"plan.*meal",
+                r"what.*eat",
+                r"food.*suggestion"
+            ],
+            "goal_setting": [
+                r"set.*goal",
+                r"create.*goal",
+                r"new.*goal"
+            ]
+        }
+        
+        # Compile all patterns and keywords once at startup
+        self.matcher = MessageMatcher(
+            self.intent_patterns, EXERCISE_TYPES, DOMAIN_KEYWORDS
+        )
+        
+        # Prebuilt typo index, loaded in the background by start()
+        self.typo_corrector: Optional[TypoCorrector] = None
+        self._typo_task: Optional[asyncio.Task] = None
+        
+        # Cache of analyses keyed by normalized message
+        self.analysis_cache = AnalysisCache(
+            max_size=config.nlp_cache_size,
+            ttl=config.nlp_cache_ttl
+        )
+        
+    async def analyze_message(self, message: str) -> Dict:
+        """Analyze message for intent, entities, and sentiment"""
+        
+        # Clean message
+        cleaned_message = self._clean_text(message)
+        
+        # Serve repeated messages from cache
+        cache_key = self.analysis_cache.make_key(cleaned_message)
+        generation = self.analysis_cache.generation
+        started = time.perf_counter()
+        cached = self.analysis_cache.get(cache_key)
+        if cached is not None:
+            cached["timings"] = {
+                "cache": (time.perf_counter() - started) * 1000
+            }
+            return cached
+            
+        # Match patterns and keywords in a single pass
+        match = self.matcher.match(cleaned_message)
+        
+        # Intent, entity and sentiment stages are independent, so run them
+        # concurrently on the NLP executor
+        (
+            (intent, intent_ms),
+            (entities, entities_ms),
+            (sentiment, sentiment_ms)
+        ) = await asyncio.gather(
+            self._run_stage(self._classify_intent, cleaned_message, match),
+            self._run_stage(self._extract_entities, cleaned_message, match),
+            self._run_stage(self._analyze_sentiment, cleaned_message)
+        )
+        
+        # Calculate confidence
+        confidence = await self._calculate_confidence(
+            intent, entities, sentiment
+        )
+        
+        analysis = {
+            "intent": intent["label"],
+            "intent_confidence": intent["confidence"],
+            "intent_tier": intent.get("tier"),
+            "entities": entities,
+            "sentiment": sentiment,
+            "confidence": confidence,
+            "domains": match["domains"]
+        }
+        
+        self.analysis_cache.put(cache_key, analysis, generation)
+        
+        # Per-stage timings (ms) for tracing
+        analysis["timings"] = {
+            "intent": intent_ms,
+            "entities": entities_ms,
+            "sentiment": sentiment_ms,
+            "total": (time.perf_counter() - started) * 1000
+        }
+        logger.debug(f"NLP stage timings: {analysis['timings']}")
+        
+        return analysis
+        
+    async def analyze_messages_batch(self, messages: List[str]) -> List[Dict]:
+        """Analyze many messages at once, in input order
+        
+        Cached and duplicate messages are analyzed once; the rest go
+        through the batched intent, entity and sentiment paths together.
+        """
+        
+        started = time.perf_counter()
+        cleaned_messages = [self._clean_text(m) for m in messages]
+        keys = [self.analysis_cache.make_key(m) for m in cleaned_messages]
+        generation = self.analysis_cache.generation
+        
+        analyses: Dict[str, Dict] = {}
+        pending: Dict[str, str] = {}
+        for key, text in zip(keys, cleaned_messages):
+            if key in analyses or key in pending:
+                continue
+            cached = self.analysis_cache.get(key)
+            if cached is not None:
+                analyses[key] = cached
+            else:
+                pending[key] = text
+                
+        if pending:
+            texts = list(pending.values())
+            intents, entities, sentiments = await asyncio.gather(
+                self.classify_intents_batch(texts),
+                self.extract_entities_batch(texts),
+                self.analyze_sentiment_batch(texts)
+            )
+            for key, text, intent, text_entities, sentiment in zip(
+                pending, texts, intents, entities, sentiments
+            ):
+                confidence = await self._calculate_confidence(
+                    intent, text_entities, sentiment
+                )
+                analysis = {
+                    "intent": intent["label"],
+                    "intent_confidence": intent["confidence"],
+                    "intent_tier": intent.get("tier"),
+                    "entities": text_entities,
+                    "sentiment": sentiment,
+                    "confidence": confidence,
+                    "domains": self.matcher.match(text)["domains"]
+                }
+                self.analysis_cache.put(key, analysis, generation)
+                analyses[key] = analysis
+                
+        total_ms = (time.perf_counter() - started) * 1000
+        logger.debug(
+            f"Batch analysis of {len(messages)} messages "
+            f"({len(pending)} uncached) took {total_ms:.1f}ms"
+        )
+        return [
+            {**analyses[key], "timings": {"batch_total": total_ms}}
+            for key in keys
+        ]
+        
+    async def _run_stage(
+        self,
+        stage: Callable,
+        *args
+    ) -> Tuple[Any, float]:
+        """Run a blocking NLP stage on the executor, timing it in ms"""
+        
+        def timed():
+            start = time.perf_counter()
+            result = stage(*args)
+            return result, (time.perf_counter() - start) * 1000
+            
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, timed)
+        
+    def close(self):
+        """Shut down the NLP executor"""
+        self.executor.shutdown(wait=True)
+        
+    def reload_intent_models(
+        self,
+        model_name: Optional[str] = None,
+        intent_patterns: Optional[Dict[str, List[str]]] = None,
+        quantization: Optional[str] = None
+    ):
+        """Reload intent classifier and patterns, invalidating cached analyses"""
+        
+        logger.info("Reloading intent models...")
+        
+        self.intent_classifier = build_intent_classifier(model_name, quantization)
+        self.intent_linear_model = HashedNgramIntentModel.load(
+            config.intent_linear_model_path
+        )
+        
+        if intent_patterns is not None:
+            self.intent_patterns = intent_patterns
+            # Pattern words must stay in the typo vocabulary
+            if self.typo_corrector is not None:
+                self.typo_corrector.extend(
+                    matcher_terms(self.intent_patterns, DOMAIN_KEYWORDS)
+                )
+        self.matcher = MessageMatcher(
+            self.intent_patterns, EXERCISE_TYPES, DOMAIN_KEYWORDS
+        )
+        
+        self.analysis_cache.clear()
+        
+    async def start(self):
+        """Load the typo index off the startup path"""
+        self._typo_task = asyncio.create_task(self._load_typo_index())
+        
+    async def stop(self):
+        """Cancel a typo index load that is still running"""
+        
+        if self._typo_task is not None:
+            self._typo_task.cancel()
+            try:
+                await self._typo_task
+            except asyncio.CancelledError:
+                pass
+            self._typo_task = None
+            
+    async def _load_typo_index(self):
+        """Load the typo index on the executor; messages pass uncorrected until then"""
+        
+        loop = asyncio.get_running_loop()
+        try:
+            self.typo_corrector = await loop.run_in_executor(
+                self.executor, self._load_typo_corrector
+            )
+        except Exception as e:
+            logger.error(f"Typo index load failed, typo correction disabled: {e}")
+            
+    def _load_typo_corrector(self) -> Optional[TypoCorrector]:
+        """Load the prebuilt typo index and add the current pattern words"""
+        
+        corrector = TypoCorrector.load_index(
+            config.typo_index_path,
+            max_distance=config.typo_max_edit_distance,
+            english_words=config.typo_english_words
+        )
+        if corrector is not None:
+            corrector.extend(
+                COACHING_VOCABULARY
+                + matcher_terms(self.intent_patterns, DOMAIN_KEYWORDS)
+            )
+        return corrector
+        
+    async def embed_messages(self, messages: List[str]) -> np.ndarray:
+        """Encode messages as L2-normalized sentence embeddings"""
+        
+        if self.sentence_encoder is None:
+            raise RuntimeError("Semantic answer reuse is disabled")
+            
+        cleaned_messages = [self._clean_text(m) for m in messages]
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, self._embed, cleaned_messages
+        )
+        
+    async def find_similar_answer(
+        self,
+        embedding: np.ndarray,
+        threshold: Optional[float] = None
+    ) -> Optional[Dict]:
+        """Find a stored answer for a semantically close question"""
+        
+        if self.answer_index is None:
+            return None
+            
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor,
+            self.answer_index.search,
+            embedding,
+            threshold or config.answer_similarity_threshold
+        )
+        
+    def remember_answer(
+        self,
+        embedding: np.ndarray,
+        question: str,
+        response: Dict,
+        domain: str
+    ):
+        """Store an answered question for later semantic reuse"""
+        
+        if self.answer_index is None:
+            return
+            
+        self.answer_index.add(embedding, {
+            "question": question,
+            "response": response,
+            "domain": domain
+        })
+        
+    def _load_sentence_encoder(self):
+        """Load the sentence encoder and an answer index sized to it"""
+        
+        model_name = config.sentence_embedding_model
+        self.sentence_tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.sentence_encoder = AutoModel.from_pretrained(model_name).eval()
+        
+        dim = self.sentence_encoder.config.hidden_size
+        if dim != config.embedding_dim:
+            logger.warning(
+                f"Encoder hidden size {dim} differs from "
+                f"embedding_dim {config.embedding_dim}, using {dim}"
+            )
+        self.answer_index = SemanticAnswerIndex(dim, config.answer_index_size)
+        
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        """Mean-pool the sentence encoder's last hidden states"""
+        
+        tokenizer = self.sentence_tokenizer
+        encoder = self.sentence_encoder
+        
+        inputs = tokenizer(
+            texts,
+            truncation=True,
+            max_length=config.max_sequence_length,
+            padding="longest",
+            return_tensors="pt"
+        )
+        
+        with torch.inference_mode():
+            hidden = encoder(**inputs).last_hidden_state
+            
+        mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+        pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+        pooled = torch.nn.functional.normalize(pooled, dim=-1)
+        
+        return pooled.numpy().astype(np.float32)
+        
+    def train_linear_intent_model(
+        self,
+        texts: List[str],
+        labels: List[str],
+        save: bool = True
+    ) -> Dict:
+        """Train the hashed n-gram intent tier on labeled messages"""
+        
+        cleaned = [self._clean_text(t) for t in texts]
+        self.intent_linear_model = HashedNgramIntentModel().fit(cleaned, labels)
+        
+        if save:
+            self.intent_linear_model.save(config.intent_linear_model_path)
+            
+        self.analysis_cache.clear()
+        
+        return {
+            "samples": len(cleaned),
+            "labels": sorted(set(labels)),
+            "saved": save
+        }
+        
+    def get_cache_stats(self) -> Dict:
+        """Get analysis cache metrics"""
+        return self.analysis_cache.stats()
+        
+    def get_intent_tier_stats(self) -> Dict:
+        """Get share of intent classifications answered by each cascade tier"""
+        
+        with self._tier_lock:
+            counts = dict(self.intent_tier_counts)
+            
+        total = sum(counts.values())
+        return {
+            "total": total,
+            "counts": counts,
+            "hit_rates": {
+                tier: count / total if total else 0.0
+                for tier, count in counts.items()
+            },
+            "threshold": config.intent_cascade_threshold
+        }
+        
+    def _record_tier(self, tier: str, count: int = 1):
+        """Count classifications answered by a cascade tier"""
+        
+        with self._tier_lock:
+            self.intent_tier_counts[tier] += count
+            
+    async def generate_response(
+        self,
+        template: str,
+        parameters: Dict
+    ) -> str:
+        """Generate natural language response from template"""
+        
+        # Fill template with parameters
+        response = compile_template(template).render(parameters)
+        
+        # Post-process for natural flow
+        response = self._improve_fluency(response)
+        
+        return response
         
     async def adjust_tone(
         self,
-        text: str,
-        target_tone: str
-    ) -> str:
-        """Adjust text tone"""
+        text: str,
+        target_tone: str
+    ) -> str:
+        """Adjust text tone"""
+        
+        if target_tone == "professional":
+            text = self._make_professional(text)
+        elif target_tone == "casual":
+            text = self._make_casual(text)
+        elif target_tone == "motivational":
+            text = self._make_motivational(text)
+            
+        return text
+        
+    def _clean_text(self, text: str) -> str:
+        """Clean and normalize text"""
+        
+        # Remove extra whitespace
+        text = " ".join(text.split())
+        
+        # Fix common typos
+        text = self._fix_common_typos(text)
+        
+        return text.strip()
+        
+    def _fix_common_typos(self, text: str) -> str:
+        """Correct misspelled coaching vocabulary"""
+        
+        if self.typo_corrector is None:
+            return text
+        return self.typo_corrector.correct_text(text)
+        
+    def _classify_intent(
+        self,
+        text: str,
+        match: Optional[Dict] = None
+    ) -> Dict:
+        """Classify message intent
+        
+        Tiers run cheapest first: compiled patterns, the hashed n-gram
+        linear model, then the transformer. A tier's answer is accepted
+        once its confidence reaches ``intent_cascade_threshold``.
+        """
+        
+        threshold = config.intent_cascade_threshold
+        
+        # Tier 1: compiled patterns
+        match = match or self.matcher.match(text)
+        if match["intent"] and PATTERN_INTENT_CONFIDENCE >= threshold:
+            self._record_tier("pattern")
+            return {
+                "label": match["intent"],
+                "confidence": PATTERN_INTENT_CONFIDENCE,
+                "tier": "pattern"
+            }
+            
+        # Tier 2: linear model over hashed n-grams
+        linear_result = None
+        if self.intent_linear_model is not None:
+            linear_result = self.intent_linear_model.predict([text])[0]
+            if linear_result["confidence"] >= threshold:
+                self._record_tier("linear")
+                return {**linear_result, "tier": "linear"}
+                
+        # Tier 3: transformer classifier
+        try:
+            results = self.intent_classifier(
+                text,
+                truncation=True,
+                max_length=config.max_sequence_length
+            )
+            if results:
+                self._record_tier("transformer")
+                return {
+                    "label": results[0]["label"],
+                    "confidence": results[0]["score"],
+                    "tier": "transformer"
+                }
+        except Exception as e:
+            logger.error(f"Intent classification error: {e}")
+            
+        result = self._fallback_intent(match["intent"], linear_result)
+        self._record_tier(result["tier"])
+        return result
+        
+    def _fallback_intent(
+        self,
+        pattern_intent: Optional[str],
+        linear_result: Optional[Dict]
+    ) -> Dict:
+        """Best answer from the cheaper tiers when the transformer fails"""
+        
+        if linear_result:
+            return {**linear_result, "tier": "linear"}
+        if pattern_intent:
+            return {
+                "label": pattern_intent,
+                "confidence": PATTERN_INTENT_CONFIDENCE,
+                "tier": "pattern"
+            }
+        return {
+            "label": "general",
+            "confidence": 0.5,
+            "tier": "fallback"
+        }
+        
+    async def classify_intents_batch(self, messages: List[str]) -> List[Dict]:
+        """Classify intents for many messages with length-bucketed batching"""
+        
+        cleaned_messages = [self._clean_text(m) for m in messages]
+        results: List[Optional[Dict]] = [None] * len(cleaned_messages)
+        
+        threshold = config.intent_cascade_threshold
+        
+        # Pattern matches never reach the later tiers
+        pending = []
+        pattern_intents: List[Optional[str]] = []
+        linear_results: Dict[int, Dict] = {}
+        for index, text in enumerate(cleaned_messages):
+            intent = self.matcher.match(text)["intent"]
+            pattern_intents.append(intent)
+            if intent and PATTERN_INTENT_CONFIDENCE >= threshold:
+                results[index] = {
+                    "label": intent,
+                    "confidence": PATTERN_INTENT_CONFIDENCE,
+                    "tier": "pattern"
+                }
+            else:
+                pending.append(index)
+        self._record_tier("pattern", len(cleaned_messages) - len(pending))
+        
+        # Confident linear predictions skip the transformer
+        if pending and self.intent_linear_model is not None:
+            predictions = self.intent_linear_model.predict(
+                [cleaned_messages[i] for i in pending]
+            )
+            escalated = []
+            for index, prediction in zip(pending, predictions):
+                if prediction["confidence"] >= threshold:
+                    results[index] = {**prediction, "tier": "linear"}
+                else:
+                    linear_results[index] = prediction
+                    escalated.append(index)
+            self._record_tier("linear", len(pending) - len(escalated))
+            pending = escalated
+            
+        if pending:
+            loop = asyncio.get_running_loop()
+            predictions = await loop.run_in_executor(
+                self.executor,
+                self._classify_intents_transformer,
+                [cleaned_messages[i] for i in pending]
+            )
+            for index, prediction in zip(pending, predictions):
+                if prediction is None:
+                    # Transformer batch failed; use the cheaper tiers' answer
+                    results[index] = self._fallback_intent(
+                        pattern_intents[index], linear_results.get(index)
+                    )
+                else:
+                    results[index] = {**prediction, "tier": "transformer"}
+                self._record_tier(results[index]["tier"])
+                
+        return results
+        
+    def _classify_intents_transformer(
+        self,
+        texts: List[str]
+    ) -> List[Optional[Dict]]:
+        """Run transformer intent classification with dynamic padding
+        
+        Messages are tokenized unpadded and explicitly truncated to
+        ``max_sequence_length``, grouped into buckets of similar length,
+        and each batch is padded only to its own longest sequence.
+        Messages in a batch that fails are returned as None.
+        """
+        
+        tokenizer = self.intent_classifier.tokenizer
+        model = self.intent_classifier.model
+        id2label = model.config.id2label
+        
+        encodings = tokenizer(
+            texts,
+            truncation=True,
+            max_length=config.max_sequence_length,
+            padding=False
+        )
+        lengths = [len(ids) for ids in encodings["input_ids"]]
+        
+        results: List[Optional[Dict]] = [None] * len(texts)
+        
+        for batch in bucket_by_length(
+            lengths, config.batch_size, config.length_bucket_width
+        ):
+            features = [
+                {key: encodings[key][i] for key in encodings.keys()}
+                for i in batch
+            ]
+            inputs = tokenizer.pad(features, padding="longest", return_tensors="pt")
+            
+            try:
+                with torch.inference_mode():
+                    logits = model(**inputs).logits
+            except Exception as e:
+                logger.error(f"Batch intent classification error: {e}")
+                continue
+                
+            scores, label_ids = torch.softmax(logits, dim=-1).max(dim=-1)
+            for i, score, label_id in zip(batch, scores.tolist(), label_ids.tolist()):
+                results[i] = {
+                    "label": id2label[label_id],
+                    "confidence": score
+                }
+                
+        return results
+        
+    def _extract_entities(
+        self,
+        text: str,
+        match: Optional[Dict] = None
+    ) -> List[Dict]:
+        """Extract entities from text"""
+        
+        # Use spaCy NER
+        entities = self._doc_entities(self.nlp(text))
+        
+        # Custom entity extraction
+        custom_entities = self._extract_custom_entities(text, match)
+        entities.extend(custom_entities)
+        
+        return entities
+        
+    async def extract_entities_batch(
+        self,
+        messages: List[str],
+        batch_size: Optional[int] = None,
+        n_process: Optional[int] = None
+    ) -> List[List[Dict]]:
+        """Extract entities from many messages using spaCy's nlp.pipe
+        
+        Results are returned in the same order as ``messages``. The pipe
+        runs on the NLP executor so it doesn't block the event loop.
+        ``n_process`` defaults to ``config.spacy_n_process``; keep that at 1
+        for the API and raise it only for offline jobs.
+        """
+        
+        cleaned_messages = [self._clean_text(m) for m in messages]
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor,
+            self._extract_entities_pipe,
+            cleaned_messages,
+            batch_size or config.spacy_batch_size,
+            n_process or config.spacy_n_process
+        )
+        
+    def _extract_entities_pipe(
+        self,
+        cleaned_messages: List[str],
+        batch_size: int,
+        n_process: int
+    ) -> List[List[Dict]]:
+        """Run nlp.pipe over cleaned messages and collect their entities"""
+        
+        docs = self.nlp.pipe(
+            cleaned_messages,
+            batch_size=batch_size,
+            n_process=n_process
+        )
+        
+        results = []
+        for text, doc in zip(cleaned_messages, docs):
+            entities = self._doc_entities(doc)
+            entities.extend(self._extract_custom_entities(text))
+            results.append(entities)
+            
+        return results
+        
+    def _doc_entities(self, doc) -> List[Dict]:
+        """Convert spaCy named entities to entity dicts"""
+        
+        return [
+            {
+                "text": ent.text,
+                "type": ent.label_,
+                "start": ent.start_char,
+                "end": ent.end_char
+            }
+            for ent in doc.ents
+        ]
+        
+    def _analyze_sentiment(self, text: str) -> float:
+        """Analyze text sentiment"""
+        
+        scores = self.sentiment_analyzer.polarity_scores(text)
+        return scores["compound"]  # Return compound score (-1 to 1)
+        
+    async def analyze_sentiment_batch(self, messages: List[str]) -> List[float]:
+        """Analyze sentiment of many messages, e.g. for historical backfills
+        
+        Returns the same compound scores as ``_analyze_sentiment`` would
+        for each message, computed with vectorized VADER rules.
+        """
+        
+        cleaned_messages = [self._clean_text(m) for m in messages]
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, self.batch_sentiment.score, cleaned_messages
+        )
+        
+    def _extract_custom_entities(
+        self,
+        text: str,
+        match: Optional[Dict] = None
+    ) -> List[Dict]:
+        """Extract domain-specific entities"""
+        
+        entities = []
+        
+        # Exercise types
+        match = match or self.matcher.match(text)
+        for exercise in match["exercises"]:
+            entities.append({
+                "text": exercise,
+                "type": "exercise_type",
+                "value": exercise
+            })
+            
+        # Time entities
+        time_pattern = r'\b(\d+)\s*(minutes?|hours?|days?|weeks?)\b'
+        for match in re.finditer(time_pattern, text.lower()):
+            entities.append({
+                "text": match.group(0),
+                "type": "duration",
+                "value": match.group(1),
+                "unit": match.group(2)
+            })
+            
+        return entities
+        
+    def _make_professional(self, text: str) -> str:
+        """Make text more professional"""
+        return PROFESSIONAL_TONE.apply(text)
+        
+    def _make_casual(self, text: str) -> str:
+        """Make text more casual"""
+        
+        if not text.lower().startswith(("hey", "hi")):
+            text = f"Hey! {text}"
+            
+        return text
+        
+    def _make_motivational(self, text: str) -> str:
+        """Make text more motivational"""
+        
+        motivational_phrases = [
+            "You've got this!",
+            "Keep pushing forward!",
+            "Every step counts!",
+            "You're doing amazing!"
+        ]
+        
+        # Add motivational phrase if not present
+        has_motivation = any(
+            phrase.lower() in text.lower() 
+            for phrase in motivational_phrases
+        )
+        
+        if not has_motivation:
+            import random
+            text += f" {random.choice(motivational_phrases)}"
+            
+        return text
+
+# === services/typo_corrector.py ===
+"""SymSpell-style typo correction over English and coaching vocabulary
+
+The index is a build artifact. Build it once with
+
+    python -m coach_core_ai.services.typo_corrector
+
+which needs the NLTK English corpus; the service only loads the saved file.
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+from collections import Counter
+from functools import lru_cache
+from itertools import combinations
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import nltk
+
+from coach_core_ai.config import config
+
+logger = logging.getLogger(__name__)
+
+# NLTK corpus providing general English word frequencies
+ENGLISH_CORPUS = "brown"
+
+# Exercise names, nutrition terms and metric names we correct towards
+COACHING_VOCABULARY = [
+    # Exercise
+    "workout", "workouts", "exercise", "exercises", "training", "cardio",
+    "fitness", "gym", "strength", "yoga", "pilates", "hiit", "running", "cycling", "swimming",
+    "walking", "stretching", "squats", "deadlift", "lunges", "pushups",
+    "pullups", "plank", "burpees", "kettlebell", "dumbbell", "barbell",
+    "treadmill", "marathon", "sprint", "interval", "mobility", "flexibility",
+    "warmup", "cooldown", "recovery",
+    # Nutrition
+    "nutrition", "protein", "carbohydrates", "carbs", "calories", "fiber",
+    "vitamins", "minerals", "hydration", "breakfast", "lunch", "dinner",
+    "snack", "snacks", "vegetables", "fruit", "smoothie", "supplements",
+    "vegetarian", "vegan", "sugar", "food", "meal", "meals", "diet", "eating",
+    # Metrics and goals
+    "weight", "steps", "distance", "heart", "rate", "sleep", "duration",
+    "pace", "repetitions", "reps", "progress", "goal", "goals", "streak",
+    "schedule", "time", "minutes", "hours",
+    # Wellness and productivity
+    "meditation", "mindfulness", "anxiety", "stress", "mood", "mental",
+    "productivity", "focus", "motivation", "tasks"
+]
+
+def load_english_frequencies() -> Counter:
+    """Lowercase word frequencies from the NLTK English corpus
+    
+    Build time only; raises LookupError if the corpus isn't installed.
+    """
+    
+    nltk.data.find(f"corpora/{ENGLISH_CORPUS}")
+    corpus = getattr(nltk.corpus, ENGLISH_CORPUS)
+    return Counter(w.lower() for w in corpus.words() if w.isalpha())
+
+def build_vocabulary(
+    vocabulary: Iterable[str],
+    english_words: int,
+    frequencies: Optional[Counter] = None
+) -> Tuple[Dict[str, int], Set[str]]:
+    """Get correction targets and the set of known words
+    
+    Targets are the ``english_words`` most frequent English words plus the
+    coaching vocabulary, which outranks English words at equal edit
+    distance. Every English word in the corpus counts as known and is
+    never corrected.
+    """
+    
+    if frequencies is None:
+        frequencies = load_english_frequencies()
+        
+    words = dict(frequencies.most_common(english_words))
+    boost = max(words.values(), default=1)
+    for word in vocabulary:
+        words[word] = boost + frequencies.get(word, 0)
+        
+    return words, set(frequencies) | set(words)
+
+def vocabulary_hash(vocabulary: Iterable[str], english_words: int) -> str:
+    """Fingerprint of the inputs an index was built from"""
+    
+    key = json.dumps([ENGLISH_CORPUS, english_words, sorted(set(vocabulary))])
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+
+class TypoCorrector:
+    """Typo correction index using precomputed deletes (SymSpell)
+    
+    Every target word is indexed under all strings obtained by deleting
+    up to ``max_distance`` characters. A misspelled token is resolved by
+    generating its own deletes and looking them up, so the cost per token
+    depends only on its length, not on the vocabulary size. Tokens in
+    ``known`` are real words and are left alone.
+    """
+    
+    TOKEN = re.compile(r"[A-Za-z]+")
+    
+    def __init__(
+        self,
+        words: Dict[str, int],
+        deletes: Dict[str, List[str]],
+        max_distance: int = 2,
+        min_length: int = 4,
+        known: Optional[Iterable[str]] = None,
+        vocabulary_hash: Optional[str] = None
+    ):
+        self.words = words
+        self.deletes = deletes
+        self.max_distance = max_distance
+        self.min_length = min_length
+        self.known = set(words).union(known or ())
+        self.vocabulary_hash = vocabulary_hash
+        
+        # Chat vocabulary is highly repetitive, so memoize per token
+        self.correct = lru_cache(maxsize=65536)(self._correct)
+        
+    @classmethod
+    def build(
+        cls,
+        words: Dict[str, int],
+        max_distance: int = 2,
+        min_length: int = 4,
+        known: Optional[Iterable[str]] = None,
+        vocabulary_hash: Optional[str] = None
+    ) -> "TypoCorrector":
+        """Build index from a word -> frequency dictionary"""
+        
+        deletes: Dict[str, List[str]] = {}
+        for word in words:
+            for variant in cls._deletes(word, max_distance):
+                deletes.setdefault(variant, []).append(word)
+                
+        return cls(words, deletes, max_distance, min_length, known, vocabulary_hash)
+        
+    @classmethod
+    def build_index(
+        cls,
+        path: str,
+        max_distance: int = 2,
+        english_words: int = 30000
+    ) -> "TypoCorrector":
+        """Build the English and coaching index and save it to ``path``"""
+        
+        words, known = build_vocabulary(COACHING_VOCABULARY, english_words)
+        corrector = cls.build(
+            words,
+            max_distance,
+            known=known,
+            vocabulary_hash=vocabulary_hash(COACHING_VOCABULARY, english_words)
+        )
+        corrector.save(path)
+        return corrector
+        
+    @classmethod
+    def load_index(
+        cls,
+        path: str,
+        max_distance: int = 2,
+        english_words: int = 30000
+    ) -> Optional["TypoCorrector"]:
+        """Load the prebuilt index, or None if it hasn't been built
+        
+        An index built with other settings is still used, with a warning.
+        """
+        
+        if not os.path.exists(path):
+            logger.warning(f"Typo index {path} not found, typo correction disabled")
+            return None
+            
+        corrector = cls.load(path)
+        if (
+            corrector.max_distance != max_distance
+            or corrector.vocabulary_hash
+            != vocabulary_hash(COACHING_VOCABULARY, english_words)
+        ):
+            logger.warning(f"Typo index {path} is stale, rebuild it")
+        return corrector
+        
+    def extend(self, vocabulary: Iterable[str]):
+        """Add correction targets, ranked like the coaching vocabulary"""
+        
+        boost = max(self.words.values(), default=1)
+        for word in set(vocabulary) - set(self.words):
+            for variant in self._deletes(word, self.max_distance):
+                self.deletes.setdefault(variant, []).append(word)
+            self.words[word] = boost
+            self.known.add(word)
+            
+        self.correct.cache_clear()
+        
+    @classmethod
+    def load(cls, path: str) -> "TypoCorrector":
+        """Load index saved by ``save``"""
+        
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+            
+        return cls(
+            data["words"],
+            data["deletes"],
+            data["max_distance"],
+            data["min_length"],
+            data.get("known"),
+            data.get("vocabulary_hash")
+        )
+        
+    def save(self, path: str):
+        """Save index as compact gzipped JSON"""
+        
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            json.dump({
+                "max_distance": self.max_distance,
+                "min_length": self.min_length,
+                "vocabulary_hash": self.vocabulary_hash,
+                "words": self.words,
+                "known": sorted(self.known - set(self.words)),
+                "deletes": self.deletes
+            }, f, separators=(",", ":"))
+            
+    def correct_text(self, text: str) -> str:
+        """Correct every alphabetic token, preserving capitalization"""
+        return self.TOKEN.sub(self._correct_match, text)
+        
+    def _correct(self, token: str) -> str:
+        """Get best correction for a lowercase token, or the token itself"""
+        
+        if token in self.known or len(token) < self.min_length:
+            return token
+            
+        # Short tokens only tolerate a single edit
+        max_distance = 1 if len(token) <= 5 else self.max_distance
+        
+        best = None
+        best_key = None
+        seen = set()
+        for variant in self._deletes(token, max_distance):
+            for candidate in self.deletes.get(variant, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                distance = self._distance(token, candidate, max_distance)
+                if distance > max_distance:
+                    continue
+                key = (distance, -self.words[candidate])
+                if best_key is None or key < best_key:
+                    best, best_key = candidate, key
+                    
+        return best or token
+        
+    def _correct_match(self, match) -> str:
+        token = match.group(0)
+        corrected = self.correct(token.lower())
+        if corrected == token.lower():
+            return token
+        return corrected.capitalize() if token[0].isupper() else corrected
+        
+    @staticmethod
+    def _deletes(word: str, max_distance: int) -> Set[str]:
+        """All strings obtained by deleting up to max_distance characters"""
+        
+        variants = {word}
+        for distance in range(1, min(max_distance, len(word) - 1) + 1):
+            for positions in combinations(range(len(word)), distance):
+                variants.add("".join(
+                    c for i, c in enumerate(word) if i not in positions
+                ))
+        return variants
+        
+    @staticmethod
+    def _distance(a: str, b: str, max_distance: int) -> int:
+        """Optimal string alignment distance, capped at max_distance + 1"""
+        
+        if abs(len(a) - len(b)) > max_distance:
+            return max_distance + 1
+            
+        previous_previous = None
+        previous = list(range(len(b) + 1))
+        for i in range(1, len(a) + 1):
+            current = [i] + [0] * len(b)
+            for j in range(1, len(b) + 1):
+                cost = 0 if a[i - 1] == b[j - 1] else 1
+                current[j] = min(
+                    previous[j] + 1,
+                    current[j - 1] + 1,
+                    previous[j - 1] + cost
+                )
+                if (
+                    i > 1 and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]
+                ):
+                    current[j] = min(current[j], previous_previous[j - 2] + 1)
+            if min(current) > max_distance:
+                return max_distance + 1
+            previous_previous, previous = previous, current
+            
+        return previous[-1]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the typo correction index")
+    parser.add_argument("--output", default=config.typo_index_path)
+    parser.add_argument("--max-distance", type=int, default=config.typo_max_edit_distance)
+    parser.add_argument("--english-words", type=int, default=config.typo_english_words)
+    args = parser.parse_args()
+    
+    index = TypoCorrector.build_index(args.output, args.max_distance, args.english_words)
+    print(f"{len(index.words)} words, {len(index.deletes)} delete entries -> {args.output}")
+
+# === services/batch_sentiment.py ===
+"""Vectorized batch VADER sentiment scoring"""
+
+import math
+import re
+import string
+from typing import List, Sequence
+
+import numpy as np
+
+PUNCTUATION_CHARS = frozenset(string.punctuation)
+REMOVE_PUNCTUATION = re.compile(f"[{re.escape(string.punctuation)}]")
+
+class BatchSentimentScorer:
+    """VADER compound scores for many messages using array operations
+    
+    Messages are tokenized once, the same way VADER's SentiText does, into
+    flat token arrays. Lexicon lookup, ALL-CAPS emphasis, booster and
+    dampener scalars, negation, the "never so/this" rule, "but" weighting,
+    punctuation emphasis and normalization are then applied to the whole
+    batch at once. Messages containing rare multi-word constructs (idioms,
+    "kind of", "sort of", "just enough", "least") are scored with the
+    analyzer's own ``polarity_scores``, so results always match
+    per-message scoring.
+    """
+    
+    def __init__(self, analyzer):
+        self.analyzer = analyzer
+        self.lexicon = analyzer.lexicon
+        self.constants = analyzer.constants
+        self.punc_list = frozenset(self.constants.PUNC_LIST)
+        
+        # Per-token feature rows, memoized since chat vocabulary repeats
+        self._token_features = {}
+        
+        # Adjacent word pairs that can trigger VADER's idiom and
+        # multi-word booster rules
+        phrases = list(self.constants.SPECIAL_CASE_IDIOMS) + [
+            phrase for phrase in self.constants.BOOSTER_DICT if " " in phrase
+        ]
+        self.fallback_bigrams = set()
+        for phrase in phrases:
+            words = phrase.lower().split()
+            self.fallback_bigrams.update(
+                f"{a} {b}" for a, b in zip(words, words[1:])
+            )
+            
+    def score(self, texts: Sequence[str]) -> List[float]:
+        """Get VADER compound score for each message"""
+        
+        n_texts = len(texts)
+        scores = [0.0] * n_texts
+        
+        # Tokenize once into flat per-token columns
+        msg, pos, first, rows = [], [], [], []
+        cap_diff = np.zeros(n_texts, dtype=bool)
+        vectorized = []
+        
+        for t, text in enumerate(texts):
+            tokens = self._tokenize(text)
+            lowered = [token.lower() for token in tokens]
+            
+            if self._needs_fallback(lowered):
+                scores[t] = self.analyzer.polarity_scores(text)["compound"]
+                continue
+                
+            vectorized.append(t)
+            n_upper = sum(token.isupper() for token in tokens)
+            cap_diff[t] = 0 < len(tokens) - n_upper < len(tokens)
+            
+            # VADER scores repeated tokens at their first occurrence
+            offset = len(msg)
+            first_seen = {}
+            for i, token in enumerate(tokens):
+                msg.append(t)
+                pos.append(i)
+                first.append(offset + first_seen.setdefault(token, i))
+                features = self._token_features.get(token)
+                if features is None:
+                    features = self._features(token)
+                rows.append(features)
+                
+        if msg:
+            columns = np.array(rows, dtype=np.float64).T
+            flags = columns[2:].astype(bool)
+            msg = np.array(msg)
+            sums = self._sum_sentiments(
+                msg, np.array(pos), np.array(first),
+                columns[0], columns[1], *flags,
+                cap_diff=cap_diff, n_texts=n_texts
+            )
+            token_counts = np.bincount(msg, minlength=n_texts)
+            
+            for t in vectorized:
+                if token_counts[t]:
+                    scores[t] = self._compound(float(sums[t]), texts[t])
+                    
+        return scores
+        
+    def _features(self, token: str) -> tuple:
+        """Build and memoize the feature row for a token"""
+        
+        # Columns: valence, booster, in_lexicon, upper, negated, never,
+        # so/this, but
+        lower = token.lower()
+        valence = self.lexicon.get(lower)
+        features = (
+            valence or 0.0,
+            self.constants.BOOSTER_DICT.get(lower, 0.0),
+            valence is not None,
+            token.isupper(),
+            lower in self.constants.NEGATE or "n't" in lower,
+            token == "never",
+            token == "so" or token == "this",
+            lower == "but"
+        )
+        
+        if len(self._token_features) >= 100000:
+            self._token_features.clear()
+        self._token_features[token] = features
+        return features
+        
+    def _sum_sentiments(
+        self, msg, pos, first, lexicon_valence, booster, in_lexicon,
+        upper, negated, never, so_this, is_but, cap_diff, n_texts
+    ) -> np.ndarray:
+        """Apply VADER's per-token rules to all tokens, summed per message"""
+        
+        c = self.constants
+        index = np.arange(len(msg))
+        caps = cap_diff[msg]
+        
+        # Booster words themselves carry no valence
+        active = in_lexicon & (booster == 0)
+        valence = np.where(active, lexicon_valence, 0.0)
+        
+        # ALL-CAPS emphasis
+        emphasis = active & upper & caps
+        valence = np.where(
+            emphasis, valence + np.where(valence > 0, c.C_INCR, -c.C_INCR), valence
+        )
+        
+        # Preceding one to three words: boosters, negation, never so/this
+        for start_i, decay in ((0, 1.0), (1, 0.95), (2, 0.9)):
+            j = np.maximum(index - (start_i + 1), 0)
+            applies = active & (pos > start_i) & ~in_lexicon[j]
+            
+            scalar = np.where(valence < 0, -booster[j], booster[j])
+            booster_caps = (booster[j] != 0) & upper[j] & caps
+            scalar = scalar + np.where(
+                booster_caps, np.where(valence > 0, c.C_INCR, -c.C_INCR), 0.0
+            )
+            valence = np.where(applies, valence + scalar * decay, valence)
+            
+            if start_i == 0:
+                factor = np.where(negated[j], c.N_SCALAR, 1.0)
+            elif start_i == 1:
+                never_so = never[j] & so_this[index - 1]
+                factor = np.where(
+                    never_so, 1.5, np.where(negated[j], c.N_SCALAR, 1.0)
+                )
+            else:
+                never_so = (never[j] & so_this[index - 2]) | so_this[index - 1]
+                factor = np.where(
+                    never_so, 1.25, np.where(negated[j], c.N_SCALAR, 1.0)
+                )
+            valence = np.where(applies, valence * factor, valence)
+            
+        # Repeated tokens take their first occurrence's valence
+        sentiments = valence[first]
+        
+        # Words before the first "but" count half, words after it 1.5x
+        no_but = np.iinfo(np.int64).max
+        but_pos = np.full(n_texts, no_but, dtype=np.int64)
+        np.minimum.at(but_pos, msg[is_but], pos[is_but])
+        token_but = but_pos[msg]
+        has_but = token_but != no_but
+        sentiments = np.where(has_but & (pos < token_but), sentiments * 0.5, sentiments)
+        sentiments = np.where(has_but & (pos > token_but), sentiments * 1.5, sentiments)
+        
+        return np.bincount(msg, weights=sentiments, minlength=n_texts)
+        
+    def _compound(self, sum_s: float, text: str) -> float:
+        """Add punctuation emphasis and normalize like VADER"""
+        
+        ep_amplifier = min(text.count("!"), 4) * 0.292
+        qm_count = text.count("?")
+        qm_amplifier = 0
+        if qm_count > 1:
+            qm_amplifier = qm_count * 0.18 if qm_count <= 3 else 0.96
+        amplifier = ep_amplifier + qm_amplifier
+        
+        if sum_s > 0:
+            sum_s += amplifier
+        elif sum_s < 0:
+            sum_s -= amplifier
+            
+        return round(sum_s / math.sqrt(sum_s * sum_s + 15), 4)
+        
+    def _needs_fallback(self, lowered: List[str]) -> bool:
+        """Check for constructs only handled by per-message scoring"""
+        
+        if "least" in lowered:
+            return True
+        return any(
+            f"{a} {b}" in self.fallback_bigrams
+            for a, b in zip(lowered, lowered[1:])
+        )
+        
+    def _tokenize(self, text: str) -> List[str]:
+        """Split text like VADER's SentiText, stripping edge punctuation"""
+        
+        words_only = {
+            w for w in REMOVE_PUNCTUATION.sub("", text).split() if len(w) > 1
+        }
+        
+        tokens = []
+        for token in text.split():
+            if len(token) <= 1:
+                continue
+            if token[0] in PUNCTUATION_CHARS:
+                n = 1
+                while n < len(token) and token[n] in PUNCTUATION_CHARS:
+                    n += 1
+                if token[:n] in self.punc_list and token[n:] in words_only:
+                    token = token[n:]
+            elif token[-1] in PUNCTUATION_CHARS:
+                n = 1
+                while n < len(token) and token[-n - 1] in PUNCTUATION_CHARS:
+                    n += 1
+                if token[-n:] in self.punc_list and token[:-n] in words_only:
+                    token = token[:-n]
+            tokens.append(token)
+            
+        return tokens
+
+# === services/context_manager.py ===
+"""Context Manager for per-conversation dialogue context"""
+
+import asyncio
+import copy
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from coach_core_ai.config import config
+
+logger = logging.getLogger(__name__)
+
+class InMemoryRedis:
+    """Local stand-in for the subset of the Redis protocol we use
+    
+    Implements async ``get``, ``set`` (with ``ex`` expiry), ``delete`` and
+    ``close`` so the Redis tier can run without a server.
+    """
+    
+    def __init__(self):
+        self._data: Dict[str, Tuple[Optional[float], bytes]] = {}
+        
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+        
+    async def set(self, key: str, value: Any, ex: Optional[int] = None) -> bool:
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        expires_at = time.monotonic() + ex if ex else None
+        self._data[key] = (expires_at, value)
+        return True
+        
+    async def delete(self, *keys: str) -> int:
+        return sum(self._data.pop(key, None) is not None for key in keys)
+        
+    async def close(self):
+        self._data.clear()
+
+class ContextManager:
+    """Bounded LRU of conversation contexts with per-entry TTL
+    
+    Contexts are keyed by (user, conversation). The in-process tier never
+    holds more than ``max_entries`` contexts, so memory stays flat no
+    matter how many users chat. An optional Redis-protocol backend shares
+    contexts across workers; the local tier then acts as a short-lived
+    read-through cache in front of it.
+    """
+    
+    def __init__(
+        self,
+        max_entries: int = config.context_max_entries,
+        ttl: int = config.cache_ttl,
+        backend: Optional[Any] = None,
+        local_ttl: int = config.context_local_ttl
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.backend = backend
+        self.local_ttl = min(local_ttl, ttl) if backend is not None else ttl
+        
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Dict]]" = OrderedDict()
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+    @classmethod
+    def from_config(cls) -> "ContextManager":
+        """Create context manager with the configured backend"""
+        
+        backend = None
+        if config.context_backend == "redis":
+            import redis.asyncio as redis
+            backend = redis.Redis(host=config.redis_host, port=config.redis_port)
+        elif config.context_backend != "memory":
+            raise ValueError(f"Unknown context backend '{config.context_backend}'")
+            
+        return cls(backend=backend)
+        
+    async def get_context(
+        self,
+        user_id: str,
+        conversation_id: Optional[str]
+    ) -> Dict:
+        """Get context for a conversation, or an empty context"""
+        
+        if not conversation_id:
+            return {}
+            
+        key = (user_id, conversation_id)
+        
+        async with self._lock:
+            context = self._get_local(key)
+        if context is not None:
+            self.hits += 1
+            return copy.deepcopy(context)
+            
+        self.misses += 1
+        if self.backend is None:
+            return {}
+            
+        raw = await self.backend.get(self._backend_key(key))
+        if raw is None:
+            return {}
+            
+        context = json.loads(raw)
+        async with self._lock:
+            self._put_local(key, context)
+        return copy.deepcopy(context)
+        
+    async def update_context(
+        self,
+        user_id: str,
+        conversation_id: Optional[str],
+        updates: Dict
+    ) -> Dict:
+        """Merge updates into a conversation's context and refresh its TTL"""
         
-        if target_tone == "professional":
-            text = self._make_professional(text)
-        elif target_tone == "casual":
-            text = self._make_casual(text)
-        elif target_tone == "motivational":
-            text = self._make_motivational(text)
+        if not conversation_id:
+            logger.warning(f"Skipping context update without conversation for {user_id}")
+            return {}
             
-        return text
+        context = await self.get_context(user_id, conversation_id)
+        context.update(copy.deepcopy(updates))
         
-    def _clean_text(self, text: str) -> str:
-        """Clean and normalize text"""
+        key = (user_id, conversation_id)
+        async with self._lock:
+            self._put_local(key, context)
+            
+        if self.backend is not None:
+            await self.backend.set(
+                self._backend_key(key),
+                json.dumps(context, default=str),
+                ex=self.ttl
+            )
+            
+        return copy.deepcopy(context)
         
-        # Remove extra whitespace
-        text = " ".join(text.split())
+    async def clear_context(self, user_id: str, conversation_id: str):
+        """Remove a conversation's context from all tiers"""
         
-        # Fix common typos
-        text = self._fix_common_typos(text)
+        key = (user_id, conversation_id)
+        async with self._lock:
+            self._entries.pop(key, None)
+        if self.backend is not None:
+            await self.backend.delete(self._backend_key(key))
+            
+    def stats(self) -> Dict:
+        """Get local tier size and hit-rate metrics"""
         
-        return text.strip()
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "backend": type(self.backend).__name__ if self.backend else None
+        }
         
-    async def _classify_intent(self, text: str) -> Dict:
-        """Classify message intent"""
+    async def close(self):
+        """Close backend connection"""
         
-        # First try pattern matching
-        for intent, patterns in self.intent_patterns.items():
-            for pattern in patterns:
-                if re.search(pattern, text.lower()):
-                    return {
-                        "label": intent,
-                        "confidence": 0.9
-                    }
+        if self.backend is not None:
+            await self.backend.close()
+            
+    def _get_local(self, key: Tuple[str, str]) -> Optional[Dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, context = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return context
+        
+    def _put_local(self, key: Tuple[str, str], context: Dict):
+        self._entries[key] = (time.monotonic() + self.local_ttl, context)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+            
+    @staticmethod
+    def _backend_key(key: Tuple[str, str]) -> str:
+        return f"context:{key[0]}:{key[1]}"
+
+# === services/persistence_queue.py ===
+"""Background queue for post-response persistence"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set
+
+from coach_core_ai.config import config
+
+logger = logging.getLogger(__name__)
+
+class PersistenceQueue:
+    """In-process queue that runs write jobs after the response is sent
+    
+    Jobs are keyed (by conversation id) and run strictly in submission
+    order per key, while different keys write concurrently up to
+    ``concurrency``. Failed jobs are retried with exponential backoff.
+    Jobs that still fail are written to the dead-letter file with the
+    data their ``describe`` callback returns, so they can be retried
+    offline; ``failed`` keeps only the most recent failures for stats.
+    ``wait_for`` gives callers read-your-writes for a key, and ``close``
+    flushes everything still pending.
+    """
+    
+    def __init__(
+        self,
+        concurrency: int = config.persistence_concurrency,
+        max_retries: int = config.persistence_max_retries,
+        retry_delay: float = config.persistence_retry_delay,
+        flush_timeout: float = config.persistence_flush_timeout,
+        max_failed: int = config.persistence_max_failed,
+        dead_letter_path: Optional[str] = config.persistence_dead_letter_path
+    ):
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.flush_timeout = flush_timeout
+        self.dead_letter_path = dead_letter_path
+        
+        # Created on first use so it binds to the running loop
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._tails: Dict[str, asyncio.Task] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._closed = False
+        self.failed: Deque[Dict] = deque(maxlen=max_failed)
+        self.failed_total = 0
+        self.completed = 0
+        self.retries = 0
+        
+    def submit(
+        self,
+        key: str,
+        job: Callable[[], Awaitable],
+        describe: Optional[Callable[[], Dict[str, Any]]] = None
+    ) -> asyncio.Task:
+        """Schedule a write job after any pending jobs for the same key
+        
+        ``describe`` is only called if the job fails permanently, and
+        returns the JSON-serializable data to dead-letter for a retry.
+        """
+        
+        if self._closed:
+            raise RuntimeError("Persistence queue is closed")
+            
+        previous = self._tails.get(key)
+        task = asyncio.create_task(self._run(key, job, previous, describe))
+        self._tails[key] = task
+        self._tasks.add(task)
+        task.add_done_callback(lambda done: self._finished(key, done))
+        return task
+        
+    async def wait_for(self, key: str):
+        """Wait until all jobs submitted so far for a key have finished"""
+        
+        tail = self._tails.get(key)
+        if tail is not None:
+            await asyncio.wait([tail])
+            
+    async def flush(self, timeout: Optional[float] = None) -> int:
+        """Wait for all pending jobs, returning how many are still running"""
+        
+        if not self._tasks:
+            return 0
+        _, pending = await asyncio.wait(list(self._tasks), timeout=timeout)
+        return len(pending)
+        
+    async def close(self):
+        """Stop accepting jobs and flush pending writes"""
+        
+        self._closed = True
+        pending = await self.flush(self.flush_timeout)
+        if pending:
+            logger.error(f"{pending} persistence jobs still pending at shutdown")
+        if self.failed_total:
+            logger.error(f"{self.failed_total} persistence jobs failed permanently")
+            
+    def stats(self) -> Dict:
+        """Get queue depth and outcome counters"""
+        
+        return {
+            "pending": len(self._tasks),
+            "completed": self.completed,
+            "retries": self.retries,
+            "failed": self.failed_total
+        }
+        
+    async def _run(
+        self,
+        key: str,
+        job: Callable[[], Awaitable],
+        previous: Optional[asyncio.Task],
+        describe: Optional[Callable[[], Dict[str, Any]]]
+    ):
+        # Keep per-key ordering, whatever the previous job's outcome
+        if previous is not None:
+            await asyncio.wait([previous])
+            
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    await job()
+                    self.completed += 1
+                    return
+                except Exception as e:
+                    if attempt == self.max_retries:
+                        logger.error(f"Persistence job for {key} failed: {e}")
+                        await self._dead_letter(key, str(e), describe)
+                        return
+                    self.retries += 1
+                    logger.warning(
+                        f"Persistence job for {key} failed (attempt {attempt + 1}), retrying: {e}"
+                    )
+                    await asyncio.sleep(self.retry_delay * 2 ** attempt)
                     
-        # Fall back to ML classifier
+    async def _dead_letter(
+        self,
+        key: str,
+        error: str,
+        describe: Optional[Callable[[], Dict[str, Any]]]
+    ):
+        """Record a permanently failed job and write its data for a retry"""
+        
+        entry = {"key": key, "error": error, "failed_at": time.time()}
+        self.failed.append(entry)
+        self.failed_total += 1
+        
+        if describe is None or not self.dead_letter_path:
+            return
         try:
-            results = self.intent_classifier(text)
-            if results:
-                return {
-                    "label": results[0]["label"],
-                    "confidence": results[0]["score"]
-                }
+            line = json.dumps({**entry, "data": describe()}, default=str)
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._append_dead_letter, line)
         except Exception as e:
-            logger.error(f"Intent classification error: {e}")
+            logger.error(f"Could not dead-letter persistence job for {key}: {e}")
             
-        return {
-            "label": "general",
-            "confidence": 0.5
+    def _append_dead_letter(self, line: str):
+        os.makedirs(os.path.dirname(self.dead_letter_path) or ".", exist_ok=True)
+        with open(self.dead_letter_path, "a") as f:
+            f.write(line + "\n")
+            
+    def _finished(self, key: str, task: asyncio.Task):
+        self._tasks.discard(task)
+        if self._tails.get(key) is task:
+            del self._tails[key]
+
+# === services/workout_library.py ===
+"""Indexed in-memory workout catalog"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from coach_core_ai.config import config
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (minutes) of the duration buckets queries can filter on
+DURATION_BUCKETS = [15, 20, 30, 45, 60, 90, 120]
+
+def iter_bits(mask: int):
+    """Yield set bit positions of ``mask`` from lowest to highest"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+class WorkoutIndex:
+    """Immutable bitset index over a list of workouts
+    
+    Workouts are sorted best-first (by rating) before indexing, so bit
+    ``i`` is the ``i``-th best workout and the lowest set bit of any
+    query mask is the best match. Each attribute value maps to a Python
+    int used as a bitset; filters are a handful of AND/OR operations.
+    """
+    
+    def __init__(self, workouts: List[Dict]):
+        self.workouts = sorted(
+            workouts, key=lambda w: (-w.get("rating", 0.0), w["id"])
+        )
+        self.all = (1 << len(self.workouts)) - 1
+        
+        by_type: Dict[str, int] = defaultdict(int)
+        by_level: Dict[str, int] = defaultdict(int)
+        requires: Dict[str, int] = defaultdict(int)
+        by_bucket = [0] * len(DURATION_BUCKETS)
+        
+        for i, workout in enumerate(self.workouts):
+            bit = 1 << i
+            by_type[workout["type"]] |= bit
+            by_level[workout["level"]] |= bit
+            for item in workout.get("equipment", []):
+                requires[item] |= bit
+            by_bucket[self._bucket(workout["duration"])] |= bit
+            
+        self.by_type = dict(by_type)
+        self.by_level = dict(by_level)
+        self.requires = dict(requires)
+        
+        # Workouts that fit within each bucket's limit
+        self.max_duration = []
+        cumulative = 0
+        for bits in by_bucket:
+            cumulative |= bits
+            self.max_duration.append(cumulative)
+            
+        # Precomputed candidates for the (type, level) pairs every query starts from
+        self.candidates = {
+            (exercise_type, level): type_bits & level_bits
+            for exercise_type, type_bits in self.by_type.items()
+            for level, level_bits in self.by_level.items()
         }
         
-    async def _extract_entities(self, text: str) -> List[Dict]:
-        """Extract entities from text"""
+    @staticmethod
+    def _bucket(duration: float) -> int:
+        for index, limit in enumerate(DURATION_BUCKETS):
+            if duration <= limit:
+                return index
+        return len(DURATION_BUCKETS) - 1
+        
+    def candidate_mask(self, exercise_type: Optional[str], level: str) -> int:
+        if exercise_type is None:
+            return self.by_level.get(level, 0)
+        return self.candidates.get((exercise_type, level), 0)
+        
+    def preference_mask(self, preferences: Dict) -> int:
+        """Bitset of workouts allowed by ``workout_preferences``"""
+        
+        mask = self.all
+        
+        # Drop workouts needing equipment the user doesn't have
+        if "equipment" in preferences:
+            available = set(preferences["equipment"])
+            for item, bits in self.requires.items():
+                if item not in available:
+                    mask &= ~bits
+                    
+        max_duration = preferences.get("max_duration")
+        if max_duration is not None:
+            # Buckets are coarse; exact limits are checked on the winners
+            mask &= self.max_duration[self._bucket(max_duration)]
+            
+        for exercise_type in preferences.get("avoid_types", []):
+            mask &= ~self.by_type.get(exercise_type, 0)
+            
+        return mask
+
+class WorkoutLibrary:
+    """Workout catalog indexed by type, level, duration and equipment
+    
+    Loaded from a JSON list of workouts, each with ``id``, ``name``,
+    ``type``, ``level``, ``duration`` (minutes), ``equipment``,
+    ``description``, ``exercises`` and optional ``rating``. Once started,
+    a background task re-checks the data file every ``reload_interval``
+    seconds and re-indexes a changed file off the event loop, so ``find``
+    is always a pure index lookup.
+    """
+    
+    def __init__(
+        self,
+        path: Optional[str] = config.workout_library_path,
+        reload_interval: int = config.workout_library_reload_interval
+    ):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.index = WorkoutIndex([])
+        self._mtime: Optional[float] = None
+        self._reload_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.reload()
+        
+    def load(self, workouts: List[Dict]):
+        """Index a list of workouts and make it the live catalog"""
+        
+        started = time.perf_counter()
+        index = WorkoutIndex(workouts)
+        # Single reference swap, so readers never see a half-built index
+        self.index = index
+        logger.info(
+            f"Indexed {len(workouts)} workouts in "
+            f"{(time.perf_counter() - started) * 1000:.1f}ms"
+        )
         
-        entities = []
+    def reload(self, force: bool = False) -> bool:
+        """Reload the data file if it changed, returning whether it did"""
         
-        # Use spaCy NER
-        doc = self.nlp(text)
+        if not self.path:
+            return False
+            
+        with self._reload_lock:
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError:
+                if self._mtime is None:
+                    logger.warning(f"Workout library {self.path} not found")
+                return False
+                
+            if not force and mtime == self._mtime:
+                return False
+                
+            try:
+                with open(self.path) as f:
+                    workouts = json.load(f)
+                self.load(workouts)
+            except Exception as e:
+                # Any malformed file keeps the previous catalog serving
+                logger.error(f"Failed to reload workout library {self.path}: {e!r}")
+                return False
+                
+            self._mtime = mtime
+            return True
+            
+    async def start(self):
+        """Start watching the data file for changes"""
         
-        for ent in doc.ents:
-            entities.append({
-                "text": ent.text,
-                "type": ent.label_,
-                "start": ent.start_char,
-                "end": ent.end_char
-            })
+        if self._task is None and self.path and self.reload_interval > 0:
+            self._task = asyncio.create_task(self._watch())
             
-        # Custom entity extraction
-        custom_entities = self._extract_custom_entities(text)
-        entities.extend(custom_entities)
+    async def stop(self):
+        """Stop watching the data file"""
+        
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            
+    async def _watch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            # Reading and re-indexing a large catalog must not block requests
+            try:
+                await loop.run_in_executor(None, self.reload)
+            except Exception as e:
+                logger.error(f"Workout library watch failed, will retry: {e!r}")
+            
+    def find(
+        self,
+        exercise_type: Optional[str],
+        level: str,
+        preferences: Optional[Dict] = None,
+        limit: int = 1
+    ) -> List[Dict]:
+        """Get the best workouts for a type (or any type) and level
+        
+        Preference filters are relaxed if nothing satisfies them all,
+        except equipment: workouts needing equipment the user doesn't
+        have are never returned.
+        """
+        
+        index = self.index
+        preferences = preferences or {}
+        candidates = index.candidate_mask(exercise_type, level)
+        if not candidates:
+            return []
+            
+        max_duration = preferences.get("max_duration")
+        results = self._take(
+            index, candidates & index.preference_mask(preferences), limit, max_duration
+        )
+        if not results:
+            # Relax soft preferences rather than recommend nothing
+            required = {
+                key: preferences[key] for key in ("equipment",) if key in preferences
+            }
+            results = self._take(
+                index, candidates & index.preference_mask(required), limit, None
+            )
+        return results
+        
+    @staticmethod
+    def _take(
+        index: WorkoutIndex,
+        mask: int,
+        limit: int,
+        max_duration: Optional[float]
+    ) -> List[Dict]:
+        results = []
+        for i in iter_bits(mask):
+            workout = index.workouts[i]
+            if max_duration is not None and workout["duration"] > max_duration:
+                continue
+            results.append(dict(workout))
+            if len(results) == limit:
+                break
+        return results
         
-        return entities
+    def stats(self) -> Dict:
+        """Get catalog size and index shape"""
         
-    def _analyze_sentiment(self, text: str) -> float:
-        """Analyze text sentiment"""
+        index = self.index
+        return {
+            "workouts": len(index.workouts),
+            "types": len(index.by_type),
+            "levels": len(index.by_level),
+            "equipment": len(index.requires),
+            "path": self.path
+        }
+
+# === services/notification_scheduler.py ===
+"""Rate-limited, persistent notification scheduler"""
+
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import os
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from coach_core_ai.config import config
+
+logger = logging.getLogger(__name__)
+
+class LocalPushSender:
+    """Local stand-in for a push provider that records what it sends
+    
+    Any sender works with the scheduler if it has an async
+    ``send_batch(notifications)`` that raises when delivery fails.
+    """
+    
+    def __init__(self, max_history: int = 10000):
+        self.sent = deque(maxlen=max_history)
         
-        scores = self.sentiment_analyzer.polarity_scores(text)
-        return scores["compound"]  # Return compound score (-1 to 1)
+    async def send_batch(self, notifications: List[Dict]):
+        self.sent.extend(notifications)
+        logger.debug(f"Sent {len(notifications)} notifications")
+
+class NotificationScheduler:
+    """Min-heap of pending notifications with per-user rate limits
+    
+    A user gets at most ``daily_limit`` notifications in any rolling
+    24 hours, at least ``min_interval`` seconds apart; only each user's
+    last ``daily_limit`` send times are kept to enforce that. Due
+    notifications that would break either limit are pushed back to the
+    earliest time they are allowed. Due notifications go to the sender
+    in batches.
+    
+    Schedules, reschedules, deliveries and cancellations are appended to
+    a JSON-lines journal at ``path``, which is replayed on start
+    (rebuilding both the queue and the rate-limit state) and compacted as
+    it grows. Journal
+    writes and compaction run on a dedicated thread, never on the event
+    loop; compaction replays the journal file itself rather than reading
+    live state. Cancellation is lazy: stale heap entries are skipped
+    when popped.
+    """
+    
+    def __init__(
+        self,
+        sender: Any,
+        path: Optional[str] = config.notification_queue_path,
+        min_interval: int = config.min_engagement_interval,
+        daily_limit: int = config.max_daily_notifications,
+        batch_size: int = config.notification_batch_size,
+        max_retries: int = config.notification_max_retries,
+        retry_delay: int = config.notification_retry_delay
+    ):
+        self.sender = sender
+        self.path = path
+        self.min_interval = min_interval
+        self.daily_limit = daily_limit
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        
+        self._heap: List[Tuple[float, int, str]] = []
+        self._pending: Dict[str, Dict] = {}
+        self._sent_times: Dict[str, List[float]] = {}  # user -> recent sends, oldest first
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None  # created by start() on the loop
+        self._task: Optional[asyncio.Task] = None
+        
+        # Journal state below is only touched on the journal thread
+        self._journal = None
+        self._journal_events = 0
+        self._snapshot_events = 0  # journal size right after the last compaction
+        self._journal_buffer: List[str] = []
+        self._journal_flush: Optional[asyncio.Task] = None
+        self._journal_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="notification-journal"
+        )
         
-    def _extract_custom_entities(self, text: str) -> List[Dict]:
-        """Extract domain-specific entities"""
+        self.sent = 0
+        self.deferred = 0
+        self.failed = 0
         
-        entities = []
+        if self.path:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._pending, self._sent_times, self._journal_events = self._read_journal()
+            self._heap = [
+                (n["due"], next(self._seq), n["id"]) for n in self._pending.values()
+            ]
+            heapq.heapify(self._heap)
+            logger.info(f"Restored {len(self._pending)} pending notifications")
+            self._journal = open(self.path, "a")
+            
+    def schedule(
+        self,
+        user_id: str,
+        payload: Dict,
+        send_at: Optional[float] = None,
+        notification_id: Optional[str] = None
+    ) -> str:
+        """Queue a notification for ``send_at`` (epoch seconds, default now)"""
         
-        # Exercise types
-        exercises = [
-            "cardio", "strength", "yoga", "pilates", "hiit",
-            "running", "cycling", "swimming"
-        ]
+        notification = {
+            "id": notification_id or uuid.uuid4().hex,
+            "user_id": user_id,
+            "payload": payload,
+            "due": send_at if send_at is not None else time.time(),
+            "attempts": 0
+        }
+        self._push(notification)
+        self._write({"op": "add", "notification": notification})
+        return notification["id"]
         
-        for exercise in exercises:
-            if exercise in text.lower():
-                entities.append({
-                    "text": exercise,
-                    "type": "exercise_type",
-                    "value": exercise
-                })
-                
-        # Time entities
-        time_pattern = r'\b(\d+)\s*(minutes?|hours?|days?|weeks?)\b'
-        for match in re.finditer(time_pattern, text.lower()):
-            entities.append({
-                "text": match.group(0),
-                "type": "duration",
-                "value": match.group(1),
-                "unit": match.group(2)
-            })
-            
-        return entities
+    def cancel(self, notification_id: str) -> bool:
+        """Cancel a pending notification"""
         
-    def _make_professional(self, text: str) -> str:
-        """Make text more professional"""
+        if self._pending.pop(notification_id, None) is None:
+            return False
+        self._write({"op": "cancel", "id": notification_id})
+        return True
+        
+    async def start(self):
+        """Start the dispatch loop"""
+        
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+            # Write anything scheduled before the loop was running
+            self._schedule_flush()
+            logger.info(f"Notification scheduler started with {len(self._pending)} pending")
+            
+    async def stop(self):
+        """Stop the dispatch loop, flush and close the journal"""
+        
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            
+        await self.flush()
+        if self._journal is not None:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self._journal_executor, self._close_journal)
+        self._journal_executor.shutdown(wait=True)
+        
+    async def flush(self):
+        """Wait until every journal event so far is written"""
+        
+        while self._journal_flush is not None or self._journal_buffer:
+            if self._journal_flush is None:
+                self._schedule_flush()
+            await asyncio.shield(self._journal_flush)
+            
+    def stats(self) -> Dict:
+        """Get queue size and delivery counters"""
         
-        replacements = {
-            "hey": "hello",
-            "hi": "greetings",
-            "awesome": "excellent",
-            "cool": "beneficial",
-            "!": "."
+        return {
+            "pending": len(self._pending),
+            "users_limited": len(self._sent_times),
+            "sent": self.sent,
+            "deferred": self.deferred,
+            "failed": self.failed
         }
         
-        for casual, professional in replacements.items():
-            text = text.replace(casual, professional)
-            text = text.replace(casual.capitalize(), professional.capitalize())
-            
-        return text
+    def next_allowed_time(self, user_id: str, now: float) -> float:
+        """Earliest time the user may receive another notification"""
+        return self._allowed_at(self._sent_times.get(user_id), now)
         
-    def _make_casual(self, text: str) -> str:
-        """Make text more casual"""
+    async def dispatch_due(self, now: Optional[float] = None) -> int:
+        """Send one batch of due notifications, returning how many were sent"""
         
-        if not text.lower().startswith(("hey", "hi")):
-            text = f"Hey! {text}"
+        now = now if now is not None else time.time()
+        batch, previous_sends = self._collect_due(now)
+        if not batch:
+            return 0
             
-        return text
+        try:
+            await self.sender.send_batch([
+                {"id": n["id"], "user_id": n["user_id"], **n["payload"]}
+                for n in batch
+            ])
+        except Exception as e:
+            logger.error(f"Notification batch of {len(batch)} failed: {e}")
+            self._retry(batch, previous_sends, now)
+            return 0
+            
+        for notification in batch:
+            self._pending.pop(notification["id"], None)
+            self._write({
+                "op": "sent",
+                "id": notification["id"],
+                "user_id": notification["user_id"],
+                "at": now
+            })
+        self.sent += len(batch)
+        return len(batch)
         
-    def _make_motivational(self, text: str) -> str:
-        """Make text more motivational"""
+    async def _run(self):
+        while True:
+            if await self.dispatch_due():
+                continue
+                
+            self._wakeup.clear()
+            timeout = None
+            if self._heap:
+                timeout = max(self._heap[0][0] - time.time(), 0)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+                
+    def _collect_due(self, now: float) -> Tuple[List[Dict], Dict[str, Optional[List[float]]]]:
+        """Pop due notifications that pass the rate limits; defer the rest"""
         
-        motivational_phrases = [
-            "You've got this!",
-            "Keep pushing forward!",
-            "Every step counts!",
-            "You're doing amazing!"
-        ]
+        batch = []
+        previous_sends: Dict[str, Optional[List[float]]] = {}
         
-        # Add motivational phrase if not present
-        has_motivation = any(
-            phrase.lower() in text.lower() 
-            for phrase in motivational_phrases
+        while self._heap and self._heap[0][0] <= now and len(batch) < self.batch_size:
+            due, _, notification_id = heapq.heappop(self._heap)
+            notification = self._pending.get(notification_id)
+            # Cancelled, or superseded by a later entry for the same notification
+            if notification is None or notification["due"] != due:
+                continue
+                
+            user_id = notification["user_id"]
+            allowed_at = self.next_allowed_time(user_id, now)
+            if allowed_at > now:
+                self.deferred += 1
+                self._reschedule(notification, allowed_at)
+                continue
+                
+            if user_id not in previous_sends:
+                times = self._sent_times.get(user_id)
+                previous_sends[user_id] = list(times) if times else None
+            self._consume(self._sent_times, user_id, now)
+            batch.append(notification)
+            
+        return batch, previous_sends
+        
+    def _retry(
+        self,
+        batch: List[Dict],
+        previous_sends: Dict[str, Optional[List[float]]],
+        now: float
+    ):
+        # Undelivered notifications don't count against the user's limits
+        for user_id, times in previous_sends.items():
+            if times is None:
+                self._sent_times.pop(user_id, None)
+            else:
+                self._sent_times[user_id] = times
+                
+        for notification in batch:
+            notification["attempts"] += 1
+            if notification["attempts"] > self.max_retries:
+                self.failed += 1
+                self.cancel(notification["id"])
+                continue
+            self._reschedule(
+                notification,
+                now + self.retry_delay * 2 ** (notification["attempts"] - 1)
+            )
+            
+    def _reschedule(self, notification: Dict, due: float):
+        """Move a pending notification to ``due``, journaling its new state"""
+        
+        notification["due"] = due
+        self._push(notification)
+        self._write({
+            "op": "reschedule",
+            "id": notification["id"],
+            "due": due,
+            "attempts": notification["attempts"]
+        })
+        
+    def _allowed_at(self, times: Optional[List[float]], now: float) -> float:
+        if not times:
+            return now
+            
+        allowed_at = times[-1] + self.min_interval
+        if len(times) >= self.daily_limit:
+            # The oldest of the last daily_limit sends must leave the 24h window
+            allowed_at = max(allowed_at, times[-self.daily_limit] + 86400)
+        return max(now, allowed_at)
+        
+    def _consume(self, sent_times: Dict[str, List[float]], user_id: str, now: float):
+        times = sent_times.setdefault(user_id, [])
+        times.append(now)
+        # Only the last daily_limit sends can hold back the next one
+        del times[:-self.daily_limit]
+        
+    def _push(self, notification: Dict):
+        self._pending[notification["id"]] = notification
+        heapq.heappush(
+            self._heap, (notification["due"], next(self._seq), notification["id"])
         )
+        # Wake the loop in case this is now the earliest notification
+        if self._wakeup is not None:
+            self._wakeup.set()
+        
+    def _write(self, event: Dict):
+        """Buffer a journal event for the journal thread"""
+        
+        if self._journal is None:
+            return
+        # Serialize now, so later in-place changes can't leak into the line
+        self._journal_buffer.append(json.dumps(event, default=str) + "\n")
+        self._schedule_flush()
+        
+    def _schedule_flush(self):
+        if self._journal_flush is not None:
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # No loop yet; start() or stop() flushes the buffer
+            return
+        self._journal_flush = asyncio.ensure_future(self._flush_journal())
+        
+    async def _flush_journal(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while self._journal_buffer:
+                lines, self._journal_buffer = self._journal_buffer, []
+                await loop.run_in_executor(
+                    self._journal_executor, self._append_journal, lines
+                )
+        except Exception as e:
+            logger.error(f"Failed to write notification journal: {e}")
+        finally:
+            self._journal_flush = None
+            
+    def _append_journal(self, lines: List[str]):
+        """Append events and compact once the journal is mostly dead (journal thread)"""
+        
+        self._journal.writelines(lines)
+        self._journal.flush()
+        self._journal_events += len(lines)
+        # Doubling since the last snapshot keeps compaction cost amortized
+        if self._journal_events > max(
+            10000, 2 * len(self._pending), 2 * self._snapshot_events
+        ):
+            self._compact()
+            
+    def _close_journal(self):
+        self._journal.close()
+        self._journal = None
+        
+    def _read_journal(self) -> Tuple[Dict[str, Dict], Dict[str, List[float]], int]:
+        """Replay the journal into pending notifications and recent send times"""
+        
+        pending: Dict[str, Dict] = {}
+        sent_times: Dict[str, List[float]] = {}
+        events = 0
+        if not os.path.exists(self.path):
+            return pending, sent_times, events
+            
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    # A torn final line from a crash mid-write
+                    continue
+                op = event["op"]
+                if op == "add":
+                    pending[event["notification"]["id"]] = event["notification"]
+                elif op == "reschedule":
+                    notification = pending.get(event["id"])
+                    if notification is not None:
+                        notification["due"] = event["due"]
+                        notification["attempts"] = event["attempts"]
+                elif op == "cancel":
+                    pending.pop(event["id"], None)
+                elif op == "sent":
+                    pending.pop(event["id"], None)
+                    self._consume(sent_times, event["user_id"], event["at"])
+                elif op == "limits":
+                    sent_times[event["user_id"]] = event["sent"]
+                events += 1
+                
+        return pending, sent_times, events
         
-        if not has_motivation:
-            import random
-            text += f" {random.choice(motivational_phrases)}"
+    def _compact(self):
+        """Rewrite the journal as a snapshot of its own replayed state (journal thread)"""
+        
+        self._journal.close()
+        try:
+            pending, sent_times, _ = self._read_journal()
             
-        return text
+            now = time.time()
+            tmp_path = f"{self.path}.tmp"
+            events = 0
+            with open(tmp_path, "w") as f:
+                for user_id, times in sent_times.items():
+                    # Sends older than a day no longer limit anything
+                    if times and times[-1] > now - 86400:
+                        f.write(json.dumps({"op": "limits", "user_id": user_id, "sent": times}) + "\n")
+                        events += 1
+                for notification in pending.values():
+                    f.write(json.dumps({"op": "add", "notification": notification}, default=str) + "\n")
+                    events += 1
+                    
+            os.replace(tmp_path, self.path)
+            self._journal_events = self._snapshot_events = events
+        finally:
+            # Keep appending to whichever journal is in place
+            self._journal = open(self.path, "a")
 
 # === services/ml_models.py ===
 """Machine Learning Models Service"""
@@ -2559,7 +6813,50 @@ from sklearn.preprocessing import StandardScaler
 import pickle
 import joblib
 
-logger = logging.getLogger(__name__)
+logger = logging.getLogger(__name__)
+
+# Churn model inputs, in column order
+CHURN_FEATURES = [
+    "days_since_last_login",
+    "total_sessions",
+    "avg_session_duration",
+    "goals_completed",
+    "goals_abandoned",
+    "messages_sent",
+    "features_used",
+    "days_active_last_month"
+]
+
+# Churn model and scaler held by each process-pool worker
+_churn_worker_state: Dict[str, Any] = {}
+
+def init_churn_worker(model, scaler):
+    """Process-pool initializer: receive the churn model once per worker"""
+    _churn_worker_state["model"] = model
+    _churn_worker_state["scaler"] = scaler
+
+def score_churn_chunk(X: np.ndarray) -> np.ndarray:
+    """Churn probabilities for a chunk of feature rows, in a pool worker"""
+    X_scaled = _churn_worker_state["scaler"].transform(X)
+    return _churn_worker_state["model"].predict_proba(X_scaled)[:, 1]
+
+def churn_factors(X: np.ndarray) -> List[List[str]]:
+    """Contributing churn factors for each row of a churn feature matrix"""
+    
+    column = {name: X[:, i] for i, name in enumerate(CHURN_FEATURES)}
+    flags = {
+        "low_activity": (
+            (column["days_active_last_month"] < 4)
+            | (column["days_since_last_login"] >= 7)
+        ),
+        "goal_difficulty": column["goals_abandoned"] > column["goals_completed"],
+        "low_feature_adoption": column["features_used"] <= 1,
+        "short_sessions": column["avg_session_duration"] < 2
+    }
+    
+    names = list(flags)
+    matrix = np.column_stack([flags[name] for name in names])
+    return [[names[j] for j in np.flatnonzero(row)] for row in matrix]
 
 class MLModels:
     """Manages all machine learning models"""
@@ -2595,13 +6892,8 @@ class MLModels:
         # Get prediction
         probability = self.models["churn_prediction"].predict_proba(X_scaled)[0][1]
         
-        # Get feature importance
-        feature_importance = self._get_feature_importance(
-            "churn_prediction", X
-        )
-        
-        # Identify contributing factors
-        factors = self._identify_churn_factors(features, feature_importance)
+        # Identify contributing factors, as the daily batch job does
+        factors = churn_factors(np.array([X], dtype=np.float64))[0]
         
         return {
             "risk_score": float(probability),
@@ -2747,16 +7039,15 @@ class MLModels:
     def _prepare_churn_features(self, features: Dict) -> List[float]:
         """Prepare features for churn prediction"""
         
-        return [
-            features.get("days_since_last_login", 0),
-            features.get("total_sessions", 0),
-            features.get("avg_session_duration", 0),
-            features.get("goals_completed", 0),
-            features.get("goals_abandoned", 0),
-            features.get("messages_sent", 0),
-            features.get("features_used", 0),
-            features.get("days_active_last_month", 0)
-        ]
+        return [features.get(name, 0) for name in CHURN_FEATURES]
+        
+    def churn_feature_matrix(self, rows: List[Dict]) -> np.ndarray:
+        """Stack churn feature dicts into a (users x CHURN_FEATURES) matrix"""
+        
+        return np.array(
+            [self._prepare_churn_features(row) for row in rows],
+            dtype=np.float64
+        ).reshape(len(rows), len(CHURN_FEATURES))
         
     def _prepare_goal_features(
         self,
@@ -2779,14 +7070,82 @@ class MLModels:
 """Data Store Service for managing persistent data"""
 
 import logging
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Dict, List, Optional, Any, Set, Tuple
 from datetime import datetime, timedelta
+import copy
 import json
 import asyncio
 from collections import defaultdict
 
+from coach_core_ai.config import config
+
 logger = logging.getLogger(__name__)
 
+# User intents whose messages are kept verbatim as key facts
+KEY_FACT_INTENTS = {"goal_setting"}
+
+def as_datetime(value: Any) -> Optional[datetime]:
+    """Parse a stored timestamp, which may already be a datetime"""
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+def message_to_dict(message: Any) -> Dict:
+    """Convert a Message model or stored message to a plain dict"""
+    if hasattr(message, "to_dict"):
+        return message.to_dict()
+    return dict(message)
+
+def fold_into_summary(summary: Optional[Dict], messages: List[Dict]) -> Dict:
+    """Fold archived messages into a conversation's running summary
+    
+    The summary stays small however long the conversation gets: intent
+    counts, the most recent distinct values per entity type, and a
+    capped list of key user statements such as goals.
+    """
+    
+    summary = summary or {
+        "message_count": 0,
+        "first_timestamp": None,
+        "last_timestamp": None,
+        "intents": {},
+        "entities": {},
+        "key_facts": []
+    }
+    
+    for message in messages:
+        summary["message_count"] += 1
+        timestamp = message.get("timestamp")
+        if summary["first_timestamp"] is None:
+            summary["first_timestamp"] = timestamp
+        summary["last_timestamp"] = timestamp
+        
+        if message.get("sender") != "user":
+            continue
+            
+        analysis = message.get("metadata") or {}
+        intent = analysis.get("intent")
+        if intent:
+            summary["intents"][intent] = summary["intents"].get(intent, 0) + 1
+            
+        for entity in analysis.get("entities", []):
+            values = summary["entities"].setdefault(entity["type"], [])
+            value = entity.get("value", entity.get("text"))
+            if value in values:
+                values.remove(value)
+            values.append(value)
+            del values[:-config.summary_max_entities]
+            
+        if intent in KEY_FACT_INTENTS:
+            summary["key_facts"].append({
+                "intent": intent,
+                "text": message.get("content", "")[:200],
+                "timestamp": timestamp
+            })
+            del summary["key_facts"][:-config.summary_max_facts]
+            
+    return summary
+
 class DataStore:
     """Manages data persistence and retrieval"""
     
@@ -2797,6 +7156,11 @@ class DataStore:
         # Using in-memory storage for demonstration
         self.users = {}
         self.conversations = {}
+        self.user_conversations = defaultdict(set)  # user id -> conversation ids
+        self.conversation_summaries = {}
+        self.conversation_archive = defaultdict(list)  # cold storage
+        self.personalization_profiles = {}
+        self.churn_scores = {}
         self.metrics = defaultdict(list)
         self.feedback = []
         self.achievements = {}
@@ -2811,6 +7175,16 @@ class DataStore:
             return User(**user_data)
         return None
         
+    async def get_users(self, user_ids: Set[str]) -> Dict[str, 'User']:
+        """Get many users by ID in one call, skipping unknown IDs"""
+        
+        from coach_core_ai.models.user_model import User
+        return {
+            user_id: User(**self.users[user_id])
+            for user_id in user_ids
+            if user_id in self.users
+        }
+        
     async def save_user(self, user: 'User') -> str:
         """Save user data"""
         
@@ -2829,12 +7203,93 @@ class DataStore:
             return Conversation(**conv_data)
         return None
         
+    async def get_conversations(
+        self,
+        conversation_ids: List[str]
+    ) -> Dict[str, 'Conversation']:
+        """Get many conversations by ID in one call, skipping unknown IDs"""
+        
+        from coach_core_ai.models.conversation_model import Conversation
+        return {
+            conversation_id: Conversation(**self.conversations[conversation_id])
+            for conversation_id in conversation_ids
+            if conversation_id in self.conversations
+        }
+        
+    async def save_conversations(self, conversations: List['Conversation']) -> List[str]:
+        """Save many conversations in a single transaction"""
+        
+        # Serialize everything first so a failure leaves the store untouched
+        records = {}
+        archives = {}
+        for conversation in conversations:
+            record = conversation.to_dict()
+            overflow = len(conversation.messages) - config.conversation_window
+            if overflow > 0:
+                archives[conversation.id] = [
+                    message_to_dict(m) for m in conversation.messages[:overflow]
+                ]
+                record["messages"] = record["messages"][overflow:]
+            records[conversation.id] = record
+            
+        # Commit
+        for conversation_id, archived in archives.items():
+            await self.archive_messages(conversation_id, archived)
+        for conversation in conversations:
+            if conversation.id in archives:
+                del conversation.messages[:len(archives[conversation.id])]
+            self.user_conversations[conversation.user_id].add(conversation.id)
+        self.conversations.update(records)
+        
+        return list(records)
+        
     async def save_conversation(self, conversation: 'Conversation') -> str:
-        """Save conversation"""
+        """Save conversation, archiving messages beyond the hot window"""
         
+        overflow = len(conversation.messages) - config.conversation_window
+        if overflow > 0:
+            archived = [message_to_dict(m) for m in conversation.messages[:overflow]]
+            del conversation.messages[:overflow]
+            await self.archive_messages(conversation.id, archived)
+            
         self.conversations[conversation.id] = conversation.to_dict()
+        self.user_conversations[conversation.user_id].add(conversation.id)
         return conversation.id
         
+    async def archive_messages(self, conversation_id: str, messages: List[Dict]):
+        """Move messages to cold storage and fold them into the summary"""
+        
+        self.conversation_archive[conversation_id].extend(messages)
+        self.conversation_summaries[conversation_id] = fold_into_summary(
+            self.conversation_summaries.get(conversation_id), messages
+        )
+        
+    async def get_conversation_summary(self, conversation_id: str) -> Optional[Dict]:
+        """Get running summary of a conversation's archived messages"""
+        
+        return self.conversation_summaries.get(conversation_id)
+        
+    async def get_conversation_history(
+        self,
+        conversation_id: str,
+        limit: Optional[int] = None
+    ) -> List[Dict]:
+        """Get full message history, including archived messages"""
+        
+        conv_data = self.conversations.get(conversation_id)
+        if conv_data is None:
+            return []
+            
+        hot = [message_to_dict(m) for m in conv_data.get("messages", [])]
+        if limit is not None and len(hot) >= limit:
+            return hot[len(hot) - limit:]
+            
+        # Only touch cold storage when the hot window isn't enough
+        archived = self.conversation_archive.get(conversation_id, [])
+        if limit is not None:
+            archived = archived[max(len(archived) - (limit - len(hot)), 0):]
+        return list(archived) + hot
+        
     async def get_progress_data(
         self,
         user_id: str,
@@ -2928,24 +7383,202 @@ class DataStore:
     async def get_user_interactions(
         self,
         user_id: str,
-        limit: int = 100
+        limit: Optional[int] = 100
     ) -> List[Dict]:
-        """Get user interactions history"""
+        """Get user interactions history
+        
+        ``limit=None`` returns the full history, archived messages included.
+        """
         
         interactions = []
         
         # Get from conversations
         for conv_id, conv in self.conversations.items():
             if conv.get("user_id") == user_id:
-                for msg in conv.get("messages", [])[:limit]:
+                messages = conv.get("messages", [])
+                if limit is None:
+                    messages = self.conversation_archive.get(conv_id, []) + messages
+                else:
+                    messages = messages[:limit]
+                for msg in messages:
+                    msg = message_to_dict(msg)
                     interactions.append({
                         "type": "message",
                         "timestamp": msg.get("timestamp"),
                         "data": msg
                     })
                     
+        if limit is None:
+            return interactions
         return interactions[-limit:]
         
+    async def get_personalization_profile(self, user_id: str) -> Optional[Dict]:
+        """Get a user's stored personalization profile state"""
+        
+        state = self.personalization_profiles.get(user_id)
+        return copy.deepcopy(state) if state is not None else None
+        
+    async def get_personalization_profiles(self, user_ids: List[str]) -> Dict[str, Dict]:
+        """Get many users' stored profile states in one call, skipping missing ones"""
+        
+        return {
+            user_id: copy.deepcopy(self.personalization_profiles[user_id])
+            for user_id in user_ids
+            if user_id in self.personalization_profiles
+        }
+        
+    async def save_personalization_profile(
+        self,
+        user_id: str,
+        state: Dict,
+        expected_version: Optional[int]
+    ) -> bool:
+        """Save profile state if its stored version is still ``expected_version``
+        
+        Returns False on a version conflict, leaving the stored state as is.
+        """
+        
+        current = self.personalization_profiles.get(user_id)
+        current_version = current["version"] if current is not None else None
+        if current_version != expected_version:
+            return False
+            
+        self.personalization_profiles[user_id] = copy.deepcopy(state)
+        return True
+        
+    async def get_churn_features(
+        self,
+        days: int = 30,
+        user_ids: Optional[List[str]] = None
+    ) -> Dict[str, Dict]:
+        """Get churn model features for users in one pass over the data
+        
+        Aggregates conversations (hot and archived) and metrics per user
+        instead of scanning all data once per user. Covers every stored
+        user unless ``user_ids`` is given, in which case only those users'
+        conversations and metrics are read. The all-users pass runs on a
+        worker thread over a snapshot of the store.
+        
+        A session is a conversation, lasting from its first to its last
+        message. Features used are the distinct intents of the user's
+        messages and the distinct metric types they logged in the window.
+        Abandoned goals are the user's goals with status "abandoned".
+        """
+        
+        if user_ids is None:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                None,
+                self._churn_features,
+                days,
+                list(self.users),
+                list(self.conversations.items()),
+                list(self.metrics.items())
+            )
+            
+        conversations = [
+            (conv_id, self.conversations[conv_id])
+            for user_id in user_ids
+            for conv_id in self.user_conversations.get(user_id, ())
+            if conv_id in self.conversations
+        ]
+        metrics = [
+            (user_id, self.metrics[user_id])
+            for user_id in user_ids if user_id in self.metrics
+        ]
+        return self._churn_features(days, user_ids, conversations, metrics)
+        
+    def _churn_features(
+        self,
+        days: int,
+        user_ids: List[str],
+        conversations: List[Tuple[str, Dict]],
+        metrics: List[Tuple[str, List[Dict]]]
+    ) -> Dict[str, Dict]:
+        """Aggregate churn features over the given conversations and metrics"""
+        
+        now = datetime.utcnow()
+        cutoff = now - timedelta(days=days)
+        
+        sessions = defaultdict(int)
+        session_minutes = defaultdict(float)
+        messages_sent = defaultdict(int)
+        features_used = defaultdict(set)
+        last_seen: Dict[str, datetime] = {}
+        active_days = defaultdict(set)
+        
+        def seen(user_id: str, timestamp: Optional[datetime]):
+            if timestamp is None:
+                return
+            if user_id not in last_seen or timestamp > last_seen[user_id]:
+                last_seen[user_id] = timestamp
+            if timestamp >= cutoff:
+                active_days[user_id].add(timestamp.date())
+                
+        for conv_id, conv in conversations:
+            user_id = conv.get("user_id")
+            sessions[user_id] += 1
+            first = last = None
+            messages = self.conversation_archive.get(conv_id, []) + conv.get("messages", [])
+            for msg in messages:
+                msg = message_to_dict(msg)
+                timestamp = as_datetime(msg.get("timestamp"))
+                if timestamp is not None:
+                    first = timestamp if first is None else min(first, timestamp)
+                    last = timestamp if last is None else max(last, timestamp)
+                if msg.get("sender") != "user":
+                    continue
+                if timestamp is not None and timestamp >= cutoff:
+                    messages_sent[user_id] += 1
+                    intent = (msg.get("metadata") or {}).get("intent")
+                    if intent and intent != "general":
+                        features_used[user_id].add(f"intent:{intent}")
+                seen(user_id, timestamp)
+            if first is not None:
+                session_minutes[user_id] += (last - first).total_seconds() / 60
+                
+        for user_id, user_metrics in metrics:
+            for metric in user_metrics:
+                timestamp = as_datetime(metric.get("timestamp"))
+                if timestamp is not None and timestamp >= cutoff and metric.get("type"):
+                    features_used[user_id].add(f"metric:{metric['type']}")
+                seen(user_id, timestamp)
+                
+        features = {}
+        for user_id in user_ids:
+            last = last_seen.get(user_id)
+            goals = self.users.get(user_id, {}).get("goals", [])
+            features[user_id] = {
+                "days_since_last_login": (now - last).days if last else days,
+                "total_sessions": sessions[user_id],
+                "avg_session_duration": (
+                    session_minutes[user_id] / sessions[user_id]
+                    if sessions[user_id] else 0.0
+                ),
+                "goals_completed": len(self.user_achievements.get(user_id, [])),
+                "goals_abandoned": sum(
+                    1 for goal in goals
+                    if (goal.get("status") if isinstance(goal, dict)
+                        else getattr(goal, "status", None)) == "abandoned"
+                ),
+                "messages_sent": messages_sent[user_id],
+                "features_used": len(features_used[user_id]),
+                "days_active_last_month": len(active_days[user_id])
+            }
+        return features
+        
+    async def save_churn_scores(self, scores: Dict[str, Dict]):
+        """Replace rows of the churn score table"""
+        self.churn_scores.update(scores)
+        
+    async def get_churn_score(self, user_id: str) -> Optional[Dict]:
+        """Get a user's latest stored churn score"""
+        return self.churn_scores.get(user_id)
+        
+    async def get_user_ids(self) -> List[str]:
+        """Get IDs of all stored users"""
+        return list(self.users)
+        
     async def get_achievement_rules(self) -> List[Dict]:
         """Get achievement rules"""
         
@@ -2968,4 +7601,748 @@ class DataStore:
                 "criteria": {"streak_days": 7}
             }
         ]
-        
\ No newline at end of file
+        
+
+# === benchmarks/spacy_throughput.py ===
+"""Throughput benchmark for spaCy entity extraction"""
+
+import argparse
+import time
+from typing import Callable, Dict, List
+
+import spacy
+
+from coach_core_ai.config import config
+from coach_core_ai.services.nlp_service import load_spacy_ner
+
+SAMPLE_MESSAGES = [
+    "Can you recommend a 30 minute cardio workout for tomorrow morning?",
+    "How am I doing on my running goal this week?",
+    "What should I eat after yoga on Saturday?",
+    "I feel stressed about work and my meeting with Sarah on Monday",
+    "Set a new goal to swim 2 hours a week in London",
+    "show progress",
+    "Plan my meals for the next 3 days, around 2000 calories",
+    "I missed my HIIT class at Equinox yesterday"
+]
+
+def _measure(label: str, run: Callable[[List[str]], None], messages: List[str]) -> float:
+    """Run benchmark and print messages per second"""
+    
+    start = time.perf_counter()
+    run(messages)
+    elapsed = time.perf_counter() - start
+    
+    throughput = len(messages) / elapsed if elapsed else float("inf")
+    print(f"{label:<40} {throughput:>10.1f} msg/s  ({elapsed:.2f}s)")
+    return throughput
+
+def run_benchmark(
+    n_messages: int = 5000,
+    batch_size: int = config.spacy_batch_size,
+    n_process: int = config.spacy_n_process
+) -> Dict:
+    """Compare full per-message pipeline against trimmed nlp.pipe batching"""
+    
+    messages = (SAMPLE_MESSAGES * (n_messages // len(SAMPLE_MESSAGES) + 1))[:n_messages]
+    
+    full_nlp = spacy.load(config.spacy_model)
+    trimmed_nlp = load_spacy_ner()
+    
+    def per_message(nlp):
+        def run(texts):
+            for text in texts:
+                [ent.label_ for ent in nlp(text).ents]
+        return run
+        
+    def batched(nlp):
+        def run(texts):
+            for doc in nlp.pipe(texts, batch_size=batch_size, n_process=n_process):
+                [ent.label_ for ent in doc.ents]
+        return run
+        
+    print(f"spaCy entity extraction, {n_messages} messages "
+          f"(batch_size={batch_size}, n_process={n_process})")
+    
+    results = {
+        "full_per_message": _measure("full pipeline, per message", per_message(full_nlp), messages),
+        "trimmed_per_message": _measure("trimmed pipeline, per message", per_message(trimmed_nlp), messages),
+        "trimmed_pipe": _measure("trimmed pipeline, nlp.pipe", batched(trimmed_nlp), messages)
+    }
+    
+    print(f"speedup (trimmed pipe vs full per message): "
+          f"{results['trimmed_pipe'] / results['full_per_message']:.1f}x")
+    
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=config.spacy_batch_size)
+    parser.add_argument("--n-process", type=int, default=config.spacy_n_process)
+    args = parser.parse_args()
+    
+    run_benchmark(args.messages, args.batch_size, args.n_process)
+
+# === benchmarks/intent_quantization.py ===
+"""Accuracy and latency harness for intent classifier quantization modes
+
+Messages go through NLPService's intent cascade (patterns, linear model,
+transformer) exactly as in serving, so accuracy is measured on intent
+names and reported per tier.
+"""
+
+import argparse
+import json
+import logging
+import time
+from collections import Counter
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from coach_core_ai.config import config
+from coach_core_ai.services.nlp_service import QUANTIZATION_MODES, NLPService
+
+logger = logging.getLogger(__name__)
+
+def load_labeled_set(path: str) -> List[Tuple[str, str]]:
+    """Load labeled intents from JSONL lines of {"text": ..., "intent": ...}"""
+    
+    samples = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                samples.append((record["text"], record["intent"]))
+    return samples
+
+def evaluate_mode(
+    service: NLPService,
+    samples: List[Tuple[str, str]],
+    model_name: str,
+    quantization: str,
+    warmup: int = 5
+) -> Dict:
+    """Measure intent accuracy and per-message latency for one mode"""
+    
+    service.reload_intent_models(model_name, quantization=quantization)
+    
+    # The transformer tier can only be right if it predicts intent names
+    id2label = service.intent_classifier.model.config.id2label
+    intents = {label for _, label in samples}
+    if not intents & set(id2label.values()):
+        logger.warning(
+            f"{model_name} labels {sorted(id2label.values())} are not intent "
+            f"names; transformer-tier answers will all count as wrong"
+        )
+        
+    cleaned = [(service._clean_text(text), label) for text, label in samples]
+    
+    # Warm up to exclude lazy initialization from latency
+    for text, _ in cleaned[:warmup]:
+        service._classify_intent(text)
+        
+    latencies = []
+    correct = 0
+    tier_counts: Counter = Counter()
+    tier_correct: Counter = Counter()
+    for text, label in cleaned:
+        start = time.perf_counter()
+        prediction = service._classify_intent(text)
+        latencies.append((time.perf_counter() - start) * 1000)
+        
+        hit = prediction["label"] == label
+        correct += hit
+        tier_counts[prediction["tier"]] += 1
+        tier_correct[prediction["tier"]] += hit
+        
+    return {
+        "mode": quantization,
+        "model": model_name,
+        "samples": len(samples),
+        "accuracy": correct / len(samples) if samples else 0.0,
+        "tiers": {
+            tier: {
+                "samples": count,
+                "accuracy": tier_correct[tier] / count
+            }
+            for tier, count in tier_counts.items()
+        },
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99))
+    }
+
+def run_harness(
+    labeled_set_path: str,
+    model_name: str = config.nlp_model,
+    modes: Tuple[str, ...] = QUANTIZATION_MODES
+) -> List[Dict]:
+    """Compare all quantization modes on the same labeled set"""
+    
+    samples = load_labeled_set(labeled_set_path)
+    service = NLPService()
+    try:
+        results = [
+            evaluate_mode(service, samples, model_name, mode) for mode in modes
+        ]
+    finally:
+        service.close()
+        
+    print(f"Intent classifier {model_name}, {len(samples)} labeled messages")
+    print(f"{'mode':<14} {'accuracy':>9} {'p50 ms':>9} {'p99 ms':>9}  tiers")
+    for result in results:
+        tiers = ", ".join(
+            f"{tier} {stats['samples']} @ {stats['accuracy']:.3f}"
+            for tier, stats in sorted(result["tiers"].items())
+        )
+        print(
+            f"{result['mode']:<14} {result['accuracy']:>9.3f} "
+            f"{result['p50_ms']:>9.2f} {result['p99_ms']:>9.2f}  {tiers}"
+        )
+        
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("labeled_set", help="JSONL file with text and intent fields")
+    parser.add_argument("--model", default=config.nlp_model)
+    parser.add_argument("--modes", nargs="+", default=list(QUANTIZATION_MODES))
+    args = parser.parse_args()
+    
+    run_harness(args.labeled_set, args.model, tuple(args.modes))
+
+# === benchmarks/typo_correction.py ===
+"""Throughput benchmark for typo correction"""
+
+import argparse
+import time
+from typing import Dict
+
+from coach_core_ai.services.typo_corrector import (
+    COACHING_VOCABULARY,
+    TypoCorrector,
+    build_vocabulary
+)
+
+SAMPLE_MESSAGES = [
+    "can you recomend a cardoi workot for tomorow",
+    "how much protien should I eat after strenght training",
+    "I want to improve my sleeep and reduce stres",
+    "show my progres on the running goal",
+    "plan my meals with more vegetables and less suger",
+    "any yoga or pilates excercises for flexibilty"
+]
+
+def run_benchmark(
+    n_messages: int = 20000,
+    max_distance: int = 2,
+    english_words: int = 30000
+) -> Dict:
+    """Measure index build time and corrected messages per second"""
+    
+    words, known = build_vocabulary(COACHING_VOCABULARY, english_words)
+    
+    start = time.perf_counter()
+    corrector = TypoCorrector.build(words, max_distance, known=known)
+    build_seconds = time.perf_counter() - start
+    
+    # Cold: every token misses the per-token memo
+    start = time.perf_counter()
+    for message in SAMPLE_MESSAGES:
+        corrector.correct_text(message)
+    cold_elapsed = time.perf_counter() - start
+    
+    # Warm: repetitive chat traffic
+    messages = (SAMPLE_MESSAGES * (n_messages // len(SAMPLE_MESSAGES) + 1))[:n_messages]
+    
+    start = time.perf_counter()
+    for message in messages:
+        corrector.correct_text(message)
+    elapsed = time.perf_counter() - start
+    
+    results = {
+        "vocabulary": len(corrector.words),
+        "delete_entries": len(corrector.deletes),
+        "build_seconds": build_seconds,
+        "cold_messages_per_second": len(SAMPLE_MESSAGES) / cold_elapsed,
+        "messages_per_second": n_messages / elapsed if elapsed else float("inf")
+    }
+    
+    print(f"vocabulary: {results['vocabulary']} words, "
+          f"{results['delete_entries']} delete entries, "
+          f"built in {build_seconds * 1000:.1f} ms")
+    print(f"cold correction: {results['cold_messages_per_second']:.0f} msg/s")
+    print(f"warm correction: {results['messages_per_second']:.0f} msg/s "
+          f"over {n_messages} messages (max_distance={max_distance})")
+    
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--max-distance", type=int, default=2)
+    parser.add_argument("--english-words", type=int, default=30000)
+    args = parser.parse_args()
+    
+    run_benchmark(args.messages, args.max_distance, args.english_words)
+
+# === benchmarks/batch_sentiment.py ===
+"""Benchmark batch sentiment scoring against per-message VADER"""
+
+import argparse
+import random
+import time
+from typing import Dict
+
+from nltk.sentiment import SentimentIntensityAnalyzer
+
+from coach_core_ai.services.batch_sentiment import BatchSentimentScorer
+
+SAMPLE_MESSAGES = [
+    "I crushed my workout today!!",
+    "Not feeling great, I skipped the gym again",
+    "The meal plan is really good but I am SO hungry",
+    "never so tired after a run",
+    "How am I doing on my goals?",
+    "I don't hate yoga, it's kind of relaxing",
+    "Stressed about work, can't focus :(",
+    "Thanks, that was very helpful"
+]
+
+def run_benchmark(n_messages: int = 50000, seed: int = 42) -> Dict:
+    """Compare per-message polarity_scores with BatchSentimentScorer"""
+    
+    random.seed(seed)
+    messages = [random.choice(SAMPLE_MESSAGES) for _ in range(n_messages)]
+    
+    analyzer = SentimentIntensityAnalyzer()
+    scorer = BatchSentimentScorer(analyzer)
+    
+    start = time.perf_counter()
+    expected = [analyzer.polarity_scores(m)["compound"] for m in messages]
+    per_message_seconds = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    actual = scorer.score(messages)
+    batch_seconds = time.perf_counter() - start
+    
+    mismatches = sum(e != a for e, a in zip(expected, actual))
+    results = {
+        "messages": n_messages,
+        "per_message_seconds": per_message_seconds,
+        "batch_seconds": batch_seconds,
+        "speedup": per_message_seconds / batch_seconds,
+        "mismatches": mismatches
+    }
+    
+    print(f"{n_messages} messages: per-message {per_message_seconds:.2f}s, "
+          f"batch {batch_seconds:.2f}s ({results['speedup']:.1f}x), "
+          f"{mismatches} mismatches")
+    
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=50000)
+    args = parser.parse_args()
+    
+    run_benchmark(args.messages)
+
+# === tests/test_context_manager.py ===
+"""Tests for ContextManager against the in-memory Redis stand-in"""
+
+import asyncio
+
+import pytest
+
+from coach_core_ai.services import context_manager
+from coach_core_ai.services.context_manager import ContextManager, InMemoryRedis
+
+class FakeClock:
+    """Manually advanced stand-in for the ``time`` module"""
+    
+    def __init__(self):
+        self.now = 1000.0
+        
+    def monotonic(self) -> float:
+        return self.now
+        
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(context_manager, "time", fake)
+    return fake
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+def test_local_tier_is_bounded_and_evicts_least_recently_used(clock):
+    manager = ContextManager(max_entries=2, ttl=60)
+    
+    async def scenario():
+        await manager.update_context("u1", "c1", {"turn": 1})
+        await manager.update_context("u1", "c2", {"turn": 2})
+        # Touch c1 so c2 becomes least recently used
+        await manager.get_context("u1", "c1")
+        await manager.update_context("u2", "c3", {"turn": 3})
+        return [
+            await manager.get_context("u1", "c1"),
+            await manager.get_context("u1", "c2"),
+            await manager.get_context("u2", "c3")
+        ]
+        
+    assert run(scenario()) == [{"turn": 1}, {}, {"turn": 3}]
+    assert manager.stats()["size"] == 2
+    assert manager.evictions == 1
+
+def test_memory_stays_flat_with_many_conversations(clock):
+    manager = ContextManager(max_entries=100, ttl=60)
+    
+    async def scenario():
+        for i in range(5000):
+            await manager.update_context(f"user-{i}", f"conv-{i}", {"i": i})
+            
+    run(scenario())
+    assert manager.stats()["size"] == 100
+    assert manager.evictions == 4900
+
+def test_entries_expire_after_ttl(clock):
+    manager = ContextManager(max_entries=10, ttl=60)
+    
+    async def scenario():
+        await manager.update_context("u1", "c1", {"last_domain": "fitness"})
+        clock.now += 59
+        fresh = await manager.get_context("u1", "c1")
+        clock.now += 2
+        expired = await manager.get_context("u1", "c1")
+        return fresh, expired
+        
+    fresh, expired = run(scenario())
+    assert fresh == {"last_domain": "fitness"}
+    assert expired == {}
+    assert manager.stats()["size"] == 0
+
+def test_updates_merge_and_returned_contexts_are_copies(clock):
+    manager = ContextManager(max_entries=10, ttl=60)
+    
+    async def scenario():
+        await manager.update_context("u1", "c1", {"last_intent": "goal_setting"})
+        await manager.update_context("u1", "c1", {"last_domain": "productivity"})
+        context = await manager.get_context("u1", "c1")
+        context["last_domain"] = "mutated"
+        return await manager.get_context("u1", "c1")
+        
+    assert run(scenario()) == {
+        "last_intent": "goal_setting",
+        "last_domain": "productivity"
+    }
+
+def test_reads_through_to_redis_tier_after_local_expiry(clock):
+    backend = InMemoryRedis()
+    writer = ContextManager(max_entries=10, ttl=600, backend=backend, local_ttl=30)
+    reader = ContextManager(max_entries=10, ttl=600, backend=backend, local_ttl=30)
+    
+    async def scenario():
+        await writer.update_context("u1", "c1", {"last_domain": "nutrition"})
+        # Another worker sees the context through the shared tier
+        shared = await reader.get_context("u1", "c1")
+        
+        await writer.update_context("u1", "c1", {"last_domain": "fitness"})
+        cached = await reader.get_context("u1", "c1")
+        
+        # Once the short local TTL lapses the reader picks up the update
+        clock.now += 31
+        refreshed = await reader.get_context("u1", "c1")
+        return shared, cached, refreshed
+        
+    shared, cached, refreshed = run(scenario())
+    assert shared == {"last_domain": "nutrition"}
+    assert cached == {"last_domain": "nutrition"}
+    assert refreshed == {"last_domain": "fitness"}
+    assert reader.hits == 1
+    assert reader.misses == 2
+
+def test_redis_tier_entries_expire_with_ttl(clock):
+    backend = InMemoryRedis()
+    manager = ContextManager(max_entries=10, ttl=60, backend=backend, local_ttl=30)
+    
+    async def scenario():
+        await manager.update_context("u1", "c1", {"turn": 1})
+        clock.now += 45
+        # Local copy has lapsed, the Redis copy has not
+        shared = await manager.get_context("u1", "c1")
+        clock.now += 31
+        expired = await manager.get_context("u1", "c1")
+        return shared, expired
+        
+    assert run(scenario()) == ({"turn": 1}, {})
+    assert backend._data == {}
+
+def test_update_without_conversation_is_skipped(clock):
+    backend = InMemoryRedis()
+    manager = ContextManager(max_entries=10, ttl=60, backend=backend)
+    
+    async def scenario():
+        updated = await manager.update_context("u1", None, {"last_domain": "fitness"})
+        context = await manager.get_context("u1", None)
+        return updated, context
+        
+    assert run(scenario()) == ({}, {})
+    assert manager.stats()["size"] == 0
+    assert backend._data == {}
+
+def test_clear_context_removes_both_tiers(clock):
+    backend = InMemoryRedis()
+    manager = ContextManager(max_entries=10, ttl=60, backend=backend)
+    
+    async def scenario():
+        await manager.update_context("u1", "c1", {"turn": 1})
+        await manager.clear_context("u1", "c1")
+        return await manager.get_context("u1", "c1")
+        
+    assert run(scenario()) == {}
+    assert backend._data == {}
+
+# === tests/test_personalization_engine.py ===
+"""Tests for personalization profile state"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from coach_core_ai.core.personalization_engine import (
+    InteractionColumns,
+    fold_interaction,
+    new_profile_state
+)
+
+def make_interactions(contents):
+    start = datetime(2026, 1, 1, 8, 0)
+    return [
+        {
+            "type": "message",
+            "timestamp": start + timedelta(minutes=i),
+            "data": {
+                "sender": "user" if i % 2 == 0 else "ai",
+                "content": content
+            }
+        }
+        for i, content in enumerate(contents)
+    ]
+
+def folded_state(interactions):
+    state = new_profile_state()
+    for interaction in interactions:
+        fold_interaction(state, interaction)
+    return state
+
+def test_columns_match_fold_on_non_ascii_content():
+    # "İ" lowercases to two code points, shifting naive offsets
+    interactions = make_interactions([
+        "İİİİİİİİİİİİİİİİİİİİ İstanbul run",
+        "Great job, team!",
+        "how far did I get",
+        "Keep it up",
+        "training with friends",
+        "Straße",
+        "ÇİĞ plan for next week",
+        "ok",
+        "no keywords here",
+        "Ünïcödé team workout"
+    ])
+    
+    expected = folded_state(interactions)
+    actual = InteractionColumns(interactions).to_profile_state()
+    
+    for key in ("social_mentions", "planning_mentions", "user_message_count", "hour_counts"):
+        assert actual[key] == expected[key], key
+    assert actual["length_mean"] == pytest.approx(expected["length_mean"])
+    assert actual["length_m2"] == pytest.approx(expected["length_m2"])
+
+def test_keyword_at_end_of_last_record_is_attributed_to_it():
+    interactions = make_interactions(["İİİİİİİİİİ", "reply", "let's make a plan"])
+    
+    state = InteractionColumns(interactions).to_profile_state()
+    
+    assert state["planning_mentions"] == 1
+    assert state["social_mentions"] == 0
+
+# === tests/test_notification_scheduler.py ===
+"""Tests for NotificationScheduler rate limits and journal replay"""
+
+import asyncio
+import os
+
+from coach_core_ai.services.notification_scheduler import (
+    LocalPushSender,
+    NotificationScheduler
+)
+
+DAY = 86400
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+def test_daily_limit_holds_in_every_rolling_day():
+    sender = LocalPushSender()
+    scheduler = NotificationScheduler(
+        sender, path=None, min_interval=3600, daily_limit=5
+    )
+    start = 1_000_000.0
+    for i in range(40):
+        scheduler.schedule("u1", {"type": "nudge"}, send_at=start + i * 600)
+        
+    async def scenario():
+        sent_at = []
+        for minute in range(4 * 24 * 60):
+            now = start + minute * 60
+            for _ in range(await scheduler.dispatch_due(now)):
+                sent_at.append(now)
+        return sent_at
+        
+    sent_at = run(scenario())
+    
+    assert len(sent_at) >= 15
+    for i, first in enumerate(sent_at):
+        in_window = [t for t in sent_at[i:] if t < first + DAY]
+        assert len(in_window) <= 5
+    assert all(b - a >= 3600 for a, b in zip(sent_at, sent_at[1:]))
+
+def test_creates_missing_journal_directory(tmp_path):
+    path = os.path.join(tmp_path, "data", "notification_queue.jsonl")
+    
+    async def scenario():
+        scheduler = NotificationScheduler(LocalPushSender(), path=path)
+        await scheduler.start()
+        scheduler.schedule("u1", {"type": "nudge"}, send_at=2e9)
+        await scheduler.stop()
+        
+    run(scenario())
+    assert NotificationScheduler(LocalPushSender(), path=path).stats()["pending"] == 1
+
+def test_deferral_survives_restart(tmp_path):
+    path = os.path.join(tmp_path, "queue.jsonl")
+    now = 1_000_000.0
+    
+    async def scenario():
+        scheduler = NotificationScheduler(
+            LocalPushSender(), path=path, min_interval=3600, daily_limit=5
+        )
+        scheduler.schedule("u1", {"n": 1}, send_at=now)
+        scheduler.schedule("u1", {"n": 2}, send_at=now)
+        assert await scheduler.dispatch_due(now) == 1
+        await scheduler.stop()
+        
+    run(scenario())
+    
+    restored = NotificationScheduler(
+        LocalPushSender(), path=path, min_interval=3600, daily_limit=5
+    )
+    assert [n["due"] for n in restored._pending.values()] == [now + 3600]
+    assert restored.next_allowed_time("u1", now) == now + 3600
+
+# === api/endpoints.py ===
+"""API endpoints for Coach Core AI Brain"""
+
+import json
+from typing import AsyncIterator, Dict, List, Optional
+
+from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+router = APIRouter()
+
+class ChatRequest(BaseModel):
+    """Chat message request"""
+    
+    user_id: str
+    message: str
+    conversation_id: Optional[str] = None
+    idempotency_key: Optional[str] = None
+
+class ChatBatchRequest(BaseModel):
+    """Batch of independent chat messages"""
+    
+    messages: List[ChatRequest]
+
+def format_sse(event: str, data) -> str:
+    """Format a Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@router.post("/chat")
+async def chat(chat_request: ChatRequest, request: Request) -> Dict:
+    """Process a chat message and return the full response
+    
+    Clients retrying a request send the same idempotency key, in the body
+    or as an ``Idempotency-Key`` header, to get the original response.
+    """
+    
+    dialogue_engine = request.app.state.dialogue_engine
+    return await dialogue_engine.process_message(
+        chat_request.user_id,
+        chat_request.message,
+        chat_request.conversation_id,
+        idempotency_key=(
+            chat_request.idempotency_key
+            or request.headers.get("Idempotency-Key")
+        )
+    )
+
+@router.post("/chat/batch")
+async def chat_batch(batch_request: ChatBatchRequest, request: Request) -> Dict:
+    """Process many chat messages, e.g. replies to a team broadcast"""
+    
+    dialogue_engine = request.app.state.dialogue_engine
+    results = await dialogue_engine.process_messages_batch([
+        {
+            "user_id": m.user_id,
+            "message": m.message,
+            "conversation_id": m.conversation_id,
+            "idempotency_key": m.idempotency_key
+        }
+        for m in batch_request.messages
+    ])
+    return {"results": results}
+
+@router.get("/conversations/{conversation_id}/history")
+async def conversation_history(
+    conversation_id: str,
+    request: Request,
+    limit: Optional[int] = None
+) -> Dict:
+    """Get a conversation's summary and full message history"""
+    
+    dialogue_engine = request.app.state.dialogue_engine
+    return await dialogue_engine.get_conversation_history(conversation_id, limit)
+
+@router.get("/users/{user_id}/churn-risk")
+async def churn_risk(user_id: str, request: Request) -> Dict:
+    """Get a user's churn risk, served from the daily scoring table"""
+    
+    engagement_manager = request.app.state.engagement_manager
+    return await engagement_manager.get_churn_risk(user_id)
+
+@router.post("/chat/stream")
+async def chat_stream(chat_request: ChatRequest, request: Request) -> StreamingResponse:
+    """Process a chat message, streaming the response as Server-Sent Events"""
+    
+    dialogue_engine = request.app.state.dialogue_engine
+    
+    async def events() -> AsyncIterator[str]:
+        async for item in dialogue_engine.process_message_stream(
+            chat_request.user_id,
+            chat_request.message,
+            chat_request.conversation_id
+        ):
+            yield format_sse(item["event"], item["data"])
+            
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )